@@ -0,0 +1,139 @@
+import numpy as np
+
+
+class GainCurveIndex:
+    """
+    价格差—增益曲线索引。
+
+    分配函数 AF* 对数据的降级只取决于价格差 d = max(0, p_n - b_n)，因此对固定的
+    (数据集, 任务)，整场拍卖都可以归结为一条一维曲线 G(d)。本索引在自适应网格上
+    预先计算 G(d)，之后任意 (p_n, b_n) 下的增益通过线性插值得到，收益函数中的积分
+    则由分段线性曲线的闭式积分得到。
+    """
+
+    def __init__(
+        self, gain_at_gaps, max_gap, tol=1e-3, initial_points=17, max_points=513
+    ):
+        """
+        在 [0, max_gap] 上自适应地构建 G(d)。
+
+        Args:
+            gain_at_gaps: 一个函数，输入价格差数组 (K,)，输出对应的增益 (K,)。
+            max_gap (float): 网格覆盖的最大价格差，超出部分按端点值外推。
+            tol (float): 线性插值在区间中点处允许的最大误差，超过则细分该区间。
+            initial_points (int): 初始均匀网格的节点数。
+            max_points (int): 网格节点数上限。
+        """
+        self.max_gap = float(max_gap)
+        gaps = np.linspace(0, self.max_gap, initial_points)
+        gains = np.asarray(gain_at_gaps(gaps), dtype=float)
+
+        # 仅检查上一轮新产生的区间，所有待检查区间的中点一次性批量评估
+        unchecked = np.ones(len(gaps) - 1, dtype=bool)
+        while len(gaps) < max_points and np.any(unchecked):
+            intervals = np.flatnonzero(unchecked)
+            midpoints = 0.5 * (gaps[intervals] + gaps[intervals + 1])
+            midpoint_gains = np.asarray(gain_at_gaps(midpoints), dtype=float)
+            linear = 0.5 * (gains[intervals] + gains[intervals + 1])
+            error = np.abs(midpoint_gains - linear)
+
+            # 插值误差过大的区间加入中点，超出节点上限时优先细分误差最大的区间
+            refine = np.flatnonzero(error > tol)
+            refine = refine[np.argsort(-error[refine])][: max_points - len(gaps)]
+            if len(refine) == 0:
+                break
+            gaps = np.concatenate([gaps, midpoints[refine]])
+            gains = np.concatenate([gains, midpoint_gains[refine]])
+            order = np.argsort(gaps, kind="stable")
+            gaps, gains = gaps[order], gains[order]
+
+            is_new = np.zeros(len(gaps), dtype=bool)
+            is_new[np.flatnonzero(order >= len(order) - len(refine))] = True
+            unchecked = is_new[:-1] | is_new[1:]
+
+        self._set_points(gaps, gains)
+
+    @classmethod
+    def from_points(cls, gaps, gains):
+        """
+        由已经评估好的节点直接构造索引，不做自适应细分。
+
+        Args:
+            gaps (np.array): 递增的价格差节点 (K,)。
+            gains (np.array): 各节点处的增益 G(d) (K,)。
+
+        Returns:
+            GainCurveIndex: 价格差—增益曲线索引。
+        """
+        index = cls.__new__(cls)
+        gaps = np.asarray(gaps, dtype=float)
+        index.max_gap = float(gaps[-1])
+        index._set_points(gaps, np.asarray(gains, dtype=float))
+        return index
+
+    def _set_points(self, gaps, gains):
+        """保存节点并预先计算累积积分"""
+        self.gaps = gaps
+        self.gains = gains
+        # 各节点处的累积积分 ∫_0^{d_i} G(d) dd (梯形公式对分段线性曲线是精确的)
+        self.cumulative = np.concatenate(
+            [[0.0], np.cumsum(np.diff(gaps) * 0.5 * (gains[:-1] + gains[1:]))]
+        )
+
+    def gain(self, gaps):
+        """
+        插值得到价格差 d 处的增益 G(d)。
+
+        Args:
+            gaps (float | np.array): 价格差。
+
+        Returns:
+            np.array: 对应的增益。
+        """
+        return np.interp(gaps, self.gaps, self.gains)
+
+    def cumulative_integral(self, gaps):
+        """
+        计算 ∫_0^d G(x) dx 的闭式结果。
+
+        Args:
+            gaps (float | np.array): 积分上限 d (>= 0)。
+
+        Returns:
+            np.array: 积分值。
+        """
+        gaps = np.asarray(gaps, dtype=float)
+        index = np.clip(np.searchsorted(self.gaps, gaps, side="right") - 1, 0, None)
+        left = self.gaps[index]
+        return self.cumulative[index] + (gaps - left) * 0.5 * (
+            self.gains[index] + self.gain(gaps)
+        )
+
+    def prediction_gain(self, p_n, b_n):
+        """
+        在价格 p_n、出价 b_n 下的预测增益。
+
+        Returns:
+            np.array: 预测增益，形状与 p_n、b_n 广播后一致。
+        """
+        return self.gain(np.maximum(0, np.asarray(p_n) - np.asarray(b_n)))
+
+    def revenue(self, p_n, b_n):
+        """
+        按 Myerson 支付规则计算收益 b_n·g(b_n) - ∫_0^{b_n} g(z) dz，其中 g(z) = G(max(0, p_n - z))。
+
+        换元 d = p_n - z 后，积分在 [0, min(p_n, b_n)] 上等于 G 在 [p_n - min(p_n, b_n), p_n]
+        上的积分，在 [p_n, b_n] 上为常数 G(0)。支持 p_n 为数组。
+
+        Returns:
+            np.array: 收益 (非负)，形状与 p_n、b_n 广播后一致。
+        """
+        p_n = np.asarray(p_n, dtype=float)
+        b_n = np.asarray(b_n, dtype=float)
+        upper = np.minimum(p_n, b_n)
+        integral_part = self.cumulative_integral(p_n) - self.cumulative_integral(
+            p_n - upper
+        )
+        integral_part += np.maximum(0, b_n - p_n) * self.gains[0]
+        revenue = b_n * self.prediction_gain(p_n, b_n) - integral_part
+        return np.maximum(0, revenue)
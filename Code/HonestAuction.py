@@ -1,7 +1,12 @@
+from collections import OrderedDict
+
 import numpy as np
-from scipy.integrate import quad
-from scipy.integrate import simpson
 from shared import ml_model, price_range
+from OLSGainEngine import OLSGainEngine, dataset_fingerprint
+from GainCurveIndex import GainCurveIndex
+from RevenueIntegrator import RevenueIntegrator
+from NoiseBank import NoiseBank
+from SellerBlocks import as_feature_matrix
 
 
 class HonestAuction:
@@ -9,18 +14,61 @@ class HonestAuction:
     实现了论文中的诚实拍卖机制，包括分配函数 (AF*) 和收益函数 (RF*)。
     """
 
-    def __init__(self, ml_model, gain_function):
+    def __init__(
+        self,
+        ml_model,
+        gain_function,
+        gain_engine=None,
+        batched=False,
+        chunk_size=25,
+        allocation_mode="sample",
+        integrator=None,
+        use_gain_curve=False,
+        curve_tol=1e-3,
+        seed=None,
+    ):
         """
         初始化拍卖机制。
 
         Args:
             ml_model: 一个遵循 scikit-learn API 的机器学习模型实例 (有.fit 和.predict 方法)。
             gain_function: 一个函数，输入 (y_true, y_pred)，输出预测增益 G。
+            gain_engine: 可选的增益引擎 (如 OLSGainEngine)，提供时替代 ml_model + gain_function 计算增益。
+            batched (bool): 是否在 calculate_revenue 中批量计算所有积分点的增益。
+                批量模式假定模型为线性回归、增益为 1 - Normalized RMSE；未提供 gain_engine 时使用默认的 OLSGainEngine。
+            chunk_size (int): 批量模式下每批降级数据的个数，用于限制 (chunk_size, M, T) 张量的峰值内存。
+            allocation_mode (str): 分配函数的增益计算方式。
+                "sample": 按 AF* 实际抽取噪声后训练模型 (默认)。
+                "expected": 由加噪 Gram 矩阵解析地计算期望增益，结果确定且无需生成噪声矩阵。
+                "common": 公共随机数模式，每场拍卖 (由 request_id 标识) 只抽取一次标准正态噪声，
+                    不同出价下按噪声大小缩放，被积函数光滑且结果可按请求复现。
+                非 "sample" 模式下未提供 gain_engine 时使用默认的 OLSGainEngine。
+            integrator (RevenueIntegrator): 收益函数的积分引擎，None 表示使用默认配置。
+            use_gain_curve (bool): 是否为每个 (数据集, 任务) 预先构建价格差—增益曲线 GainCurveIndex，
+                之后所有价格与出价下的增益和收益都由该曲线插值、闭式积分得到。
+            curve_tol (float): 增益曲线自适应网格的插值误差容限。
+            seed (int): "common" 模式下噪声库的随机种子。
         """
+        if allocation_mode not in ("sample", "expected", "common"):
+            raise ValueError(f"Unknown allocation_mode: {allocation_mode}")
+
         self.ml_model = ml_model
         self.gain_function = gain_function
+        if (
+            batched or allocation_mode != "sample" or use_gain_curve
+        ) and gain_engine is None:
+            gain_engine = OLSGainEngine(gain_function=gain_function)
+        self.gain_engine = gain_engine
+        self.batched = batched
+        self.chunk_size = chunk_size
+        self.allocation_mode = allocation_mode
+        self.integrator = integrator if integrator is not None else RevenueIntegrator()
+        self.use_gain_curve = use_gain_curve
+        self.curve_tol = curve_tol
+        self._gain_curves = OrderedDict()
+        self.noise_bank = NoiseBank(seed)
 
-    def _allocation_function(self, X, p_n, b_n, noise_std=0.1):
+    def _allocation_function(self, X, p_n, b_n, noise_std=0.1, noise=None):
         """
         分配函数 AF* (Allocation Function)。
         根据价格 p_n 和出价 float(b_n) 的差异，向数据 X 添加高斯噪声来降级其质量。
@@ -31,6 +79,7 @@ class HonestAuction:
             p_n (float): 市场设定的价格。
             float(b_n) (float): 买家的出价。
             noise_std (float): 基础噪声的标准差。
+            noise (np.array): 可选的标准正态噪声 (M, T)，提供时按噪声大小缩放后使用，不再重新抽取。
 
         Returns:
             np.array: 降级后的数据 X_tilde。
@@ -40,25 +89,91 @@ class HonestAuction:
         else:
             # 噪声大小与价格和出价的差值成正比
             noise_magnitude = max(0, p_n - float(b_n))
-            noise = np.random.normal(0, noise_std * noise_magnitude, X.shape)
+            if noise is None:
+                noise = np.random.normal(0, noise_std * noise_magnitude, X.shape)
+            else:
+                noise = noise_std * noise_magnitude * noise
             X_tilde = X + noise
             return X_tilde
 
-    def get_prediction_gain(self, X, Y, p_n, b_n):
+    def _noise_variance(self, p_n, bids, noise_std=0.1):
         """
-        在给定价格和出价下，计算预测增益 G。
+        分配函数 AF* 所加噪声的方差 (noise_std·max(0, p_n - b_n))²。
+
+        Args:
+            p_n (float): 市场设定的价格。
+            bids (np.array): 买家的出价 (K,)。
+            noise_std (float): 基础噪声的标准差。
+
+        Returns:
+            np.array: 每个出价对应的噪声方差 (K,)。
+        """
+        noise_magnitude = np.maximum(0, p_n - np.asarray(bids, dtype=float))
+        return (noise_std * noise_magnitude) ** 2
+
+    def _batch_allocation_function(self, X, p_n, bids, noise_std=0.1):
+        """
+        批量分配函数：一次性为多个出价生成降级数据。
 
         Args:
             X (np.array): 原始特征数据 (M, T)。
+            p_n (float): 市场设定的价格。
+            bids (np.array): 买家的出价 (K,)。
+            noise_std (float): 基础噪声的标准差。
+
+        Returns:
+            np.array: 降级后的数据 (K, M, T)。
+        """
+        noise_magnitude = np.maximum(0, p_n - np.asarray(bids, dtype=float))
+        noise = np.random.standard_normal((len(noise_magnitude),) + X.shape)
+        noise *= (noise_std * noise_magnitude)[:, None, None]
+        return X + noise
+
+    def _common_noise(self, X, Y, request_id=None):
+        """
+        "common" 模式下一场拍卖共用的标准正态噪声，由 (request_id, 数据集, 任务) 唯一确定。
+
+        Returns:
+            np.array: 标准正态噪声 (M, T)。
+        """
+        key = (request_id, dataset_fingerprint(X, Y))
+        return self.noise_bank.standard_normal(X.shape, key=key)
+
+    def get_prediction_gain(self, X, Y, p_n, b_n, request_id=None):
+        """
+        在给定价格和出价下，计算预测增益 G。
+
+        Args:
+            X (np.array): 原始特征数据 (M, T)，也可以是多列卖家的 SellerBlocks。
             Y (np.array): 目标预测任务数据 (T,)。
             p_n (float): 市场价格。
             float(b_n) (float): 买家出价。
+            request_id: "common" 模式下标识本场拍卖的请求编号，决定所用的噪声。
 
         Returns:
             float: 预测增益 G。
         """
+        X = as_feature_matrix(X)
+        if self.use_gain_curve:
+            index = self.gain_curve(X, Y, p_n, request_id=request_id)
+            return float(index.prediction_gain(p_n, float(b_n)))
+        if self.allocation_mode == "expected" or (
+            self.allocation_mode == "common" and self.gain_engine is not None
+        ):
+            gains = self.get_prediction_gains(
+                X, Y, p_n, [float(b_n)], request_id=request_id
+            )
+            return float(gains[0])
+
         # 1. 根据价格和出价分配（可能降级的）数据
-        X_tilde = self._allocation_function(X, p_n, float(b_n))
+        noise = None
+        if self.allocation_mode == "common":
+            noise = self._common_noise(X, Y, request_id)
+        X_tilde = self._allocation_function(X, p_n, float(b_n), noise=noise)
+
+        # 使用增益引擎时，直接由充分统计量计算增益；仅缓存未加噪的原始数据
+        if self.gain_engine is not None:
+            return self.gain_engine.gain(X_tilde, Y, use_cache=X_tilde is X)
 
         # 2. 训练模型并进行预测
         # 注意：在实际应用中，需要划分训练集和测试集。为简化，这里在整个数据集上操作。
@@ -74,42 +189,233 @@ class HonestAuction:
         gain = self.gain_function(y_train, y_pred)
         return gain
 
-    # 优化积分
-    def calculate_revenue(self, X, Y, p_n, b_n):
-        gain_at_b_n = self.get_prediction_gain(X, Y, p_n, float(b_n))
+    def get_prediction_gains(self, X, Y, p_n, bids, noise=None, request_id=None):
+        """
+        批量计算一组出价下的预测增益，按 chunk_size 分批构造降级数据。
+        所有出价共用同一份噪声时 (noise 或 "common" 模式)，由 OLSGainEngine.common_noise_gains
+        直接组装统计量，不再构造降级数据。
+
+        Args:
+            X (np.array): 原始特征数据 (M, T)，也可以是多列卖家的 SellerBlocks。
+            Y (np.array): 目标预测任务数据 (T,)。
+            p_n (float): 市场价格。
+            bids (np.array): 买家出价 (K,)。
+            noise (np.array): 可选的、所有出价共用的标准正态噪声 (M, T)。
+            request_id: "common" 模式下标识本场拍卖的请求编号。
+
+        Returns:
+            np.array: 每个出价对应的预测增益 (K,)。
+        """
+        X = as_feature_matrix(X)
+        bids = np.asarray(bids, dtype=float)
+        if self.allocation_mode == "expected":
+            stats = self.gain_engine.statistics(X, Y)
+            return self.gain_engine.expected_gains(
+                stats, self._noise_variance(p_n, bids)
+            )
+
+        if noise is None and self.allocation_mode == "common":
+            noise = self._common_noise(X, Y, request_id)
+        if noise is not None:
+            scales = np.sqrt(self._noise_variance(p_n, bids))
+            return self.gain_engine.common_noise_gains(X, Y, noise, scales)
+
+        gains = np.empty(len(bids))
+
+        # 出价不低于价格时数据不降级，增益都等于全量数据的增益
+        full = bids >= p_n
+        if np.any(full):
+            gains[full] = self.gain_engine.gain(X, Y)
 
-        # 定义需要积分的函数 g(z) = G(Y, M(AF*(z, p_n)))
-        def gain_as_function_of_bid(z):
-            return self.get_prediction_gain(X, Y, p_n, z)
+        noisy_bids = bids[~full]
+        noisy_gains = np.empty(len(noisy_bids))
+        for start in range(0, len(noisy_bids), self.chunk_size):
+            chunk = noisy_bids[start : start + self.chunk_size]
+            X_batch = self._batch_allocation_function(X, p_n, chunk)
+            noisy_gains[start : start + len(chunk)] = self.gain_engine.batch_gains(
+                X_batch, Y
+            )
+        gains[~full] = noisy_gains
+        return gains
 
-        # 将积分区间分成两部分进行积分
-        b_n_half = float(b_n) / 2
-        integral_part_1, _ = quad(gain_as_function_of_bid, 0, b_n_half, limit=50)
-        integral_part_2, _ = quad(
-            gain_as_function_of_bid, b_n_half, float(b_n), limit=50
+    def _gains_at_gaps(self, X, Y, gaps, noise=None, request_id=None):
+        """
+        计算一组价格差 d 下的预测增益 G(d)。
+
+        Args:
+            X (np.array): 原始特征数据 (M, T)。
+            Y (np.array): 目标预测任务数据 (T,)。
+            gaps (np.array): 价格差 (K,)。
+            noise (np.array): 可选的、所有价格差共用的标准正态噪声 (M, T)。
+            request_id: "common" 模式下标识本场拍卖的请求编号。
+
+        Returns:
+            np.array: 每个价格差对应的预测增益 (K,)。
+        """
+        gaps = np.asarray(gaps, dtype=float)
+        if self.gain_engine is None:
+            return np.array(
+                [self.get_prediction_gain(X, Y, gap, 0.0, request_id) for gap in gaps]
+            )
+
+        # 价格取 max_gap、出价取 max_gap - d 时，价格差恰好为 d
+        max_gap = float(np.max(gaps, initial=0))
+        return self.get_prediction_gains(
+            X, Y, max_gap, max_gap - gaps, noise=noise, request_id=request_id
         )
 
-        # 合并积分结果
-        integral_part = integral_part_1 + integral_part_2
+    def gain_curve(self, X, Y, max_gap=0, request_id=None):
+        """
+        获取 (X, Y) 的价格差—增益曲线索引，同一数据集与任务只构建一次。
+
+        Args:
+            X (np.array): 原始特征数据 (M, T)，也可以是多列卖家的 SellerBlocks。
+            Y (np.array): 目标预测任务数据 (T,)。
+            max_gap (float): 曲线至少需要覆盖的价格差，默认覆盖整个价格范围。
+            request_id: "common" 模式下标识本场拍卖的请求编号。
+
+        Returns:
+            GainCurveIndex: 价格差—增益曲线索引。
+        """
+        X = as_feature_matrix(X)
+        max_gap = max(price_range[1], float(np.max(max_gap)))
+        key = (dataset_fingerprint(X, Y), request_id)
+        index = self._gain_curves.get(key)
+        if index is not None and index.max_gap >= max_gap:
+            self._gain_curves.move_to_end(key)
+            return index
+
+        # "sample" 模式下整条曲线共用一次标准正态噪声，使 G(d) 成为确定的连续曲线
+        noise = None
+        if self.allocation_mode == "sample":
+            noise = np.random.standard_normal(X.shape)
+
+        def gain_at_gaps(gaps):
+            return self._gains_at_gaps(X, Y, gaps, noise=noise, request_id=request_id)
+
+        index = GainCurveIndex(gain_at_gaps, max_gap, tol=self.curve_tol)
+        self._gain_curves[key] = index
+        if len(self._gain_curves) > 8:
+            self._gain_curves.popitem(last=False)
+        return index
+
+    @staticmethod
+    def _revenue_grid_gaps(prices, b_n, num_points):
+        """
+        收益计算所需的价格差节点：只覆盖各价格的积分窗口 [max(0, p - b_n), p] 的并集。
+
+        窗口端点都是节点，其余节点按长度分配给并集中的各区间，总数约为 num_points，
+        与出价和价格的数值无关。
+
+        Args:
+            prices (np.array): 市场价格 (K,)。
+            b_n (float): 买家出价。
+            num_points (int): 节点数目标。
+
+        Returns:
+            np.array: 递增的价格差节点。
+        """
+        lower = np.maximum(0, prices - b_n)
+        order = np.argsort(lower)
+        intervals = []
+        for lo, hi in zip(lower[order], prices[order]):
+            if intervals and lo <= intervals[-1][1]:
+                intervals[-1][1] = max(intervals[-1][1], hi)
+            else:
+                intervals.append([lo, hi])
+
+        lengths = np.array([hi - lo for lo, hi in intervals])
+        total = lengths.sum()
+        gaps = [np.concatenate([lower, prices])]
+        if total > 0:
+            for (lo, hi), length in zip(intervals, lengths):
+                count = max(2, int(round(num_points * length / total)))
+                gaps.append(np.linspace(lo, hi, count))
+        return np.unique(np.concatenate(gaps))
+
+    def calculate_revenue_grid(
+        self, X, Y, prices, b_n, request_id=None, num_points=257
+    ):
+        """
+        一次性计算同一出价在一组价格下的 (反事实) 收益，供 DynamicPricer 更新所有专家的权重。
+
+        不同价格下的被积函数 g(z) = G(max(0, p - z)) 都是同一条价格差曲线 G(d) 的片段，
+        因此所有价格共享同一组 G(d) 的评估：启用 use_gain_curve 时直接使用缓存的曲线索引，
+        否则只在各价格积分窗口的并集上取约 num_points 个节点，一次性批量评估 G(d)，
+        不做自适应细分。增益评估次数因此与价格个数和出价大小都无关。
+
+        Args:
+            X (np.array): 原始特征数据 (M, T)，也可以是多列卖家的 SellerBlocks。
+            Y (np.array): 目标预测任务数据 (T,)。
+            prices (np.array): 市场价格 (K,)。
+            b_n (float): 买家出价。
+            request_id: "common" 模式下标识本场拍卖的请求编号。
+            num_points (int): 未启用 use_gain_curve 时价格差节点数的目标。
+
+        Returns:
+            np.array: 每个价格对应的收益 (K,)。
+        """
+        X = as_feature_matrix(X)
+        prices = np.asarray(prices, dtype=float)
+        b_n = float(b_n)
+        max_gap = float(np.max(prices, initial=0))
+
+        if self.use_gain_curve:
+            index = self.gain_curve(X, Y, max_gap, request_id=request_id)
+        else:
+            gaps = self._revenue_grid_gaps(prices, b_n, num_points)
+            gains = self._gains_at_gaps(X, Y, gaps, request_id=request_id)
+            index = GainCurveIndex.from_points(gaps, gains)
 
-        # Myerson 支付规则
-        revenue = float(b_n) * gain_at_b_n - integral_part
+        return index.revenue(prices, b_n)
 
-        return float(max(0, revenue))  # 确保收益不为负
+    def calculate_revenue(self, X, Y, p_n, b_n, return_error=False, request_id=None):
+        """
+        收益函数 RF* (Revenue Function)。
+        根据 Myerson 支付规则 r_n = b_n·g(b_n) - ∫_0^{b_n} g(z) dz 计算应向买家收取的费用，
+        其中 g(z) = G(Y, M(AF*(z, p_n)))。积分由 self.integrator 完成。
 
-    def calculate_revenue(self, X, Y, p_n, b_n):
-        gain_at_b_n = self.get_prediction_gain(X, Y, p_n, float(b_n))
+        默认的 "sample" 模式下每个出价都重新抽取噪声，g(z) 是带噪声的，自适应细分无法
+        达到容限，因此该模式改用固定节点的 Simpson 规则，每次固定消耗
+        max_evaluations + 1 次增益评估。此时收益本身含有抽样噪声，返回的误差估计包含
+        由节点间波动估计的噪声标准误；需要可复现的收益时请使用 "common" 或 "expected" 模式。
 
-        # 定义需要积分的函数
-        def gain_as_function_of_bid(z):
-            return self.get_prediction_gain(X, Y, p_n, z)
+        Args:
+            X (np.array): 原始特征数据 (M, T)，也可以是多列卖家的 SellerBlocks。
+            Y (np.array): 目标预测任务数据 (T,)。
+            p_n (float): 市场价格。
+            float(b_n) (float): 买家出价。
+            return_error (bool): 是否同时返回积分的误差估计。
+            request_id: "common" 模式下标识本场拍卖的请求编号，同一请求的收益可以复现。
 
-        # 使用 Simpson 积分
-        z_vals = np.linspace(0, float(b_n), 100)  # 划分为 100 个点
-        y_vals = np.array([gain_as_function_of_bid(z) for z in z_vals])
-        integral_part = simpson(y_vals, z_vals)
+        Returns:
+            float: 应收取的收益 r_n；return_error 为 True 时返回 (r_n, 误差估计)。
+        """
+        X = as_feature_matrix(X)
+        if self.use_gain_curve:
+            # 曲线索引上的积分是闭式的
+            index = self.gain_curve(X, Y, p_n, request_id=request_id)
+            revenue = float(index.revenue(p_n, float(b_n)))
+            return (revenue, 0.0) if return_error else revenue
 
-        # 计算收益
-        revenue = float(b_n) * gain_at_b_n - integral_part
+        # 定义需要积分的函数 g(z)，一次评估一组出价
+        vectorized = self.gain_engine is not None and (
+            self.batched or self.allocation_mode != "sample"
+        )
 
-        return float(max(0, revenue))
+        def gain_as_function_of_bid(z_vals):
+            if vectorized:
+                return self.get_prediction_gains(
+                    X, Y, p_n, z_vals, request_id=request_id
+                )
+            return np.array(
+                [self.get_prediction_gain(X, Y, p_n, z, request_id) for z in z_vals]
+            )
+
+        revenue, error, _ = self.integrator.revenue(
+            gain_as_function_of_bid,
+            p_n,
+            float(b_n),
+            adaptive=self.allocation_mode != "sample",
+        )
+        return (revenue, error) if return_error else revenue
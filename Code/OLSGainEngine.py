@@ -0,0 +1,516 @@
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+from gain_functions import evaluate_gains, normalized_rmse_gain
+
+
+def dataset_fingerprint(*arrays):
+    """
+    计算若干数组内容的指纹，用作缓存的键。
+
+    Args:
+        *arrays (np.array): 需要计算指纹的数组。
+
+    Returns:
+        str: 十六进制表示的指纹。
+    """
+    hasher = hashlib.blake2b(digest_size=16)
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        hasher.update(repr((array.shape, array.dtype.str)).encode())
+        hasher.update(array.data)
+    return hasher.hexdigest()
+
+
+def _as_float(value):
+    """标量转为 float，多任务的 (B,) 数组保持不变"""
+    value = np.asarray(value, dtype=float)
+    return float(value) if value.ndim == 0 else value
+
+
+class SufficientStatistics:
+    """
+    线性回归 (带截距) 的充分统计量，全部基于中心化后的数据。
+    """
+
+    def __init__(self, X, Y):
+        """
+        根据原始数据计算充分统计量。
+
+        Args:
+            X (np.array): 特征数据 (M, T)，每一行对应一个卖家。
+            Y (np.array): 目标预测任务数据 (T,)；也可以是 B 个任务堆叠成的 (T, B)，
+                此时 y_mean、yy 为 (B,)，xy 为 (M, B)，所有任务共享同一个 Gram 矩阵。
+        """
+        X = np.asarray(X, dtype=float)
+        Y = np.asarray(Y, dtype=float)
+        self.n_samples = X.shape[1]
+        self.x_mean = X.mean(axis=1)
+        self.y_mean = Y.mean(axis=0)
+        X_c = X - self.x_mean[:, None]
+        Y_c = Y - self.y_mean
+        self.gram = X_c @ X_c.T  # X·Xᵀ (M, M)
+        self.xy = X_c @ Y_c  # X·Y (M,) 或 (M, B)
+        self.yy = _as_float((Y_c * Y_c).sum(axis=0))  # Yᵀ·Y
+        self._spectrum = None
+
+    @classmethod
+    def from_moments(cls, n_samples, x_mean, y_mean, gram, xy, yy):
+        """
+        直接由 (中心化的) 矩构造充分统计量，例如由增量模型维护的统计量。
+
+        Args:
+            n_samples (float): 样本数 (带遗忘因子时为有效样本数)。
+            x_mean (np.array): 特征均值 (M,)。
+            y_mean (float): 目标均值。
+            gram (np.array): 中心化的 X·Xᵀ (M, M)。
+            xy (np.array): 中心化的 X·Y (M,)。
+            yy (float): 中心化的 Yᵀ·Y。
+
+        Returns:
+            SufficientStatistics: 充分统计量。
+        """
+        stats = cls.__new__(cls)
+        stats.n_samples = n_samples
+        stats.x_mean = np.asarray(x_mean, dtype=float)
+        stats.y_mean = _as_float(y_mean)
+        stats.gram = np.asarray(gram, dtype=float)
+        stats.xy = np.asarray(xy, dtype=float)
+        stats.yy = _as_float(yy)
+        stats._spectrum = None
+        return stats
+
+    def spectrum(self):
+        """
+        Gram 矩阵的特征分解，首次调用时计算并缓存。
+
+        Returns:
+            tuple: (eigenvalues (M,), projected_xy (M,))，其中 projected_xy = Qᵀ·(X·Y)。
+        """
+        if self._spectrum is None:
+            eigenvalues, eigenvectors = np.linalg.eigh(self.gram)
+            self._spectrum = (eigenvalues, eigenvectors.T @ self.xy)
+        return self._spectrum
+
+
+class OLSGainEngine:
+    """
+    基于充分统计量的 OLS 增益引擎。
+
+    可替代 ml_model (LinearRegression) + gain_function_rmse 的组合：
+    增益 G = 1 - RMSE / std(Y) 只依赖于残差平方和，而残差平方和可以由
+    X·Xᵀ、X·Y、Yᵀ·Y 通过一次 M×M 的求解得到，无需在 (T, M) 矩阵上拟合模型。
+
+    增益函数可以替换为 gain_functions 中的其他函数：带有 from_ssr 的增益 (RMSE、R²)
+    直接由残差平方和得到，其余增益则由批量预测值一次性计算。
+
+    除样本内增益外，还支持两种样本外增益：
+    "loo" 利用帽子矩阵 / PRESS 恒等式 e_i / (1 - h_ii) 由一次分解得到精确的留一残差；
+    "holdout" 在固定并缓存的训练/测试划分上评估。未加噪数据的样本外增益按数据指纹缓存。
+    """
+
+    def __init__(
+        self,
+        cache_size=16,
+        rcond=None,
+        evaluation="in_sample",
+        holdout_fraction=0.2,
+        seed=0,
+        gain_function=None,
+    ):
+        """
+        初始化增益引擎。
+
+        Args:
+            cache_size (int): 缓存的充分统计量个数上限。
+            rcond (float): 求 Gram 矩阵伪逆时的相对截断阈值，None 表示使用 numpy 默认值。
+            evaluation (str): 增益的评估方式，"in_sample"、"loo" 或 "holdout"。
+            holdout_fraction (float): "holdout" 模式下测试集所占比例。
+            seed (int): "holdout" 模式下划分训练/测试集的随机种子。
+            gain_function: 增益函数，输入 (y_true, y_pred)，默认为 1 - Normalized RMSE。
+        """
+        if evaluation not in ("in_sample", "loo", "holdout"):
+            raise ValueError(f"Unknown evaluation: {evaluation}")
+
+        self.cache_size = cache_size
+        self.rcond = rcond
+        self.evaluation = evaluation
+        self.holdout_fraction = holdout_fraction
+        self.seed = seed
+        self.gain_function = (
+            gain_function if gain_function is not None else normalized_rmse_gain
+        )
+        self._cache = OrderedDict()
+
+    @property
+    def _from_ssr(self):
+        """增益函数能否由残差平方和直接得到 (仅适用于样本内增益)"""
+        if self.evaluation != "in_sample":
+            return None
+        return getattr(self.gain_function, "from_ssr", None)
+
+    @property
+    def supports_ssr(self):
+        """增益能否由残差平方和直接得到，即 gains_from_ssr 是否可用"""
+        return self._from_ssr is not None
+
+    def gains_from_ssr(self, ssr, yy):
+        """
+        由残差平方和与 Yᵀ·Y 计算增益 (可批量)，Y 为常数时增益为 1。
+
+        Args:
+            ssr (np.array): 残差平方和，任意形状 (多任务时最后一维为 B)。
+            yy (float | np.array): 中心化的 Yᵀ·Y，多任务时为 (B,)。
+
+        Returns:
+            np.array: 与 ssr 形状相同的增益。
+        """
+        if not self.supports_ssr:
+            raise ValueError("gain_function cannot be computed from statistics alone")
+        return self._ssr_gains(ssr, yy)
+
+    def _ssr_gains(self, ssr, yy):
+        """由残差平方和与 Yᵀ·Y 计算增益，Y 为常数时增益为 1 (yy 为 (B,) 时按任务逐列判断)"""
+        if np.ndim(yy) > 0:
+            constant = yy == 0
+            gains = self._from_ssr(ssr, np.where(constant, 1.0, yy))
+            return np.where(constant, 1.0, gains)
+        if yy == 0:
+            return np.ones(np.shape(ssr))
+        return self._from_ssr(ssr, yy)
+
+    def statistics(self, X, Y, use_cache=True):
+        """
+        获取 (X, Y) 的充分统计量，命中缓存时直接返回。
+
+        Args:
+            X (np.array): 特征数据 (M, T)。
+            Y (np.array): 目标预测任务数据 (T,)。
+            use_cache (bool): 是否读写缓存。对每次都不同的数据 (如加噪后的数据) 应关闭。
+
+        Returns:
+            SufficientStatistics: 充分统计量。
+        """
+        if not use_cache:
+            return SufficientStatistics(X, Y)
+
+        return self._cached(
+            dataset_fingerprint(X, Y), lambda: SufficientStatistics(X, Y)
+        )
+
+    def residual_sum_of_squares(self, gram, xy, yy):
+        """
+        由充分统计量计算 OLS 的残差平方和 SSR = Yᵀ·Y - (X·Y)ᵀ (X·Xᵀ)⁺ (X·Y)。
+
+        支持批量输入：gram 为 (..., M, M)，xy 为 (..., M)，yy 可广播。
+
+        Returns:
+            np.array: 残差平方和，形状为批量维度。
+        """
+        beta = np.einsum("...ij,...j->...i", self._pinv(gram), xy)
+        explained = np.einsum("...i,...i->...", xy, beta)
+        return np.maximum(yy - explained, 0.0)
+
+    def _pinv(self, gram):
+        """对称 Gram 矩阵 (可批量) 的伪逆"""
+        if self.rcond is None:
+            return np.linalg.pinv(gram, hermitian=True)
+        return np.linalg.pinv(gram, rcond=self.rcond, hermitian=True)
+
+    def _cached(self, key, compute):
+        """从 LRU 缓存中读取 key 对应的结果，未命中时调用 compute() 计算并写入"""
+        value = self._cache.get(key)
+        if value is None:
+            value = compute()
+            self._cache[key] = value
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(key)
+        return value
+
+    def gain_from_statistics(self, stats):
+        """
+        由充分统计量计算增益，要求增益函数可由残差平方和得到 (如 1 - Normalized RMSE)。
+
+        Args:
+            stats (SufficientStatistics): 充分统计量。
+
+        Returns:
+            float: 预测增益 G。
+        """
+        if self._from_ssr is None:
+            raise ValueError("gain_function cannot be computed from statistics alone")
+        ssr = self.residual_sum_of_squares(stats.gram, stats.xy, stats.yy)
+        # 例如 RMSE / std(Y) = sqrt(SSR / T) / sqrt(Yᵀ·Y / T)
+        return float(self._ssr_gains(ssr, stats.yy))
+
+    def gain(self, X, Y, use_cache=True):
+        """
+        计算在数据 X 上训练线性回归预测 Y 所得的增益。
+
+        Args:
+            X (np.array): 特征数据 (M, T)。
+            Y (np.array): 目标预测任务数据 (T,)。
+            use_cache (bool): 是否缓存 (X, Y) 的充分统计量。
+
+        Returns:
+            float: 预测增益 G。
+        """
+        if self._from_ssr is not None:
+            return self.gain_from_statistics(self.statistics(X, Y, use_cache))
+
+        def prediction_gain():
+            return float(self._prediction_gains(np.asarray(X)[None], Y)[0])
+
+        if not use_cache:
+            return prediction_gain()
+        key = (self.evaluation, dataset_fingerprint(X, Y))
+        return self._cached(key, prediction_gain)
+
+    def _holdout_split(self, n_samples):
+        """
+        "holdout" 模式下固定的训练/测试划分，同一样本数总是得到相同的划分。
+
+        Returns:
+            tuple: (训练集下标, 测试集下标)。
+        """
+
+        def split():
+            permutation = np.random.default_rng(self.seed).permutation(n_samples)
+            n_test = min(
+                max(1, int(round(n_samples * self.holdout_fraction))), n_samples - 2
+            )
+            return np.sort(permutation[n_test:]), np.sort(permutation[:n_test])
+
+        return self._cached(("split", n_samples), split)
+
+    def _prediction_gains(self, X_batch, Y):
+        """
+        批量计算预测值，再用增益函数一次性计算增益。适用于所有评估方式与增益函数。
+
+        Args:
+            X_batch (np.array): K 份特征数据 (K, M, T)。
+            Y (np.array): 目标预测任务数据 (T,)。
+
+        Returns:
+            np.array: 每份数据对应的预测增益 (K,)。
+        """
+        X_batch = np.asarray(X_batch, dtype=float)
+        Y = np.asarray(Y, dtype=float)
+        T = X_batch.shape[2]
+
+        if self.evaluation == "in_sample":
+            X_c = X_batch - X_batch.mean(axis=2, keepdims=True)
+            Y_c = Y - Y.mean()
+            gram_pinv = self._pinv(X_c @ X_c.transpose(0, 2, 1))
+            beta = np.einsum("kij,kj->ki", gram_pinv, X_c @ Y_c)
+            y_true = Y
+            y_pred = Y.mean() + np.einsum("kmt,km->kt", X_c, beta)
+        elif self.evaluation == "holdout":
+            train, test = self._holdout_split(T)
+            X_train, Y_train = X_batch[:, :, train], Y[train]
+            x_mean = X_train.mean(axis=2)
+            y_mean = Y_train.mean()
+            X_c = X_train - x_mean[:, :, None]
+            gram_pinv = self._pinv(X_c @ X_c.transpose(0, 2, 1))
+            beta = np.einsum("kij,kj->ki", gram_pinv, X_c @ (Y_train - y_mean))
+            X_test = X_batch[:, :, test] - x_mean[:, :, None]
+            y_true = Y[test]
+            y_pred = y_mean + np.einsum("kmt,km->kt", X_test, beta)
+        else:
+            # 留一残差 e_i / (1 - h_ii)，带截距时 h_ii = 1/T + x_iᵀ (X·Xᵀ)⁺ x_i
+            X_c = X_batch - X_batch.mean(axis=2, keepdims=True)
+            Y_c = Y - Y.mean()
+            gram_pinv = self._pinv(X_c @ X_c.transpose(0, 2, 1))
+            beta = np.einsum("kij,kj->ki", gram_pinv, X_c @ Y_c)
+            fitted_residuals = Y_c - np.einsum("kmt,km->kt", X_c, beta)
+            leverage = 1 / T + np.einsum("kmt,kmt->kt", X_c, gram_pinv @ X_c)
+            residuals = fitted_residuals / np.maximum(1 - leverage, np.finfo(float).eps)
+            y_true = Y
+            y_pred = Y - residuals
+
+        return evaluate_gains(self.gain_function, y_true, y_pred)
+
+    def batch_gains(self, X_batch, Y):
+        """
+        批量计算增益：对 K 份特征数据分别训练线性回归并评估增益。
+
+        所有 Gram 矩阵通过一次批量矩阵乘法得到，K 个 M×M 系统在一次堆叠的
+        np.linalg 调用中求解。
+
+        Args:
+            X_batch (np.array): K 份特征数据 (K, M, T)。
+            Y (np.array): 目标预测任务数据 (T,)。
+
+        Returns:
+            np.array: 每份数据对应的预测增益 (K,)。
+        """
+        if self._from_ssr is None:
+            return self._prediction_gains(X_batch, Y)
+
+        X_batch = np.asarray(X_batch, dtype=float)
+        Y = np.asarray(Y, dtype=float)
+        Y_c = Y - Y.mean()
+        yy = float(Y_c @ Y_c)
+
+        X_c = X_batch - X_batch.mean(axis=2, keepdims=True)
+        gram = X_c @ X_c.transpose(0, 2, 1)  # (K, M, M)
+        xy = X_c @ Y_c  # (K, M)
+        ssr = self.residual_sum_of_squares(gram, xy, yy)
+        return self._ssr_gains(ssr, yy)
+
+    def coalition_gains(self, stats, masks, chunk_size=None, tol=1e-10):
+        """
+        批量计算卖家联盟 (特征子集) 的增益，无需切片原始数据。
+
+        联盟 S 的 Gram 矩阵即全体 Gram 矩阵的子块 gram[S, S]。联盟按大小 k 分组，同组的
+        子块堆叠成 (K_k, k, k) 一次做 Cholesky 分解 L·Lᵀ，令 L·z = X·Y_S，
+        则 SSR = Yᵀ·Y - ‖z‖²，每个联盟的代价为 O(k³) 而不是全尺寸伪逆的 O(M³)。
+        Cholesky 失败或病态 (联盟内存在共线卖家) 的联盟改用子块的伪逆求解。
+
+        Args:
+            stats (SufficientStatistics): 全部卖家数据的充分统计量。
+            masks (np.array): 联盟的成员矩阵 (K, M)，True 表示卖家在联盟中。
+            chunk_size (int): 每批求解的联盟个数，None 表示按约 2^24 个矩阵元素自动选择。
+            tol (float): Cholesky 对角元平方相对于 Gram 对角元低于该值时视为病态。
+
+        Returns:
+            np.array: 每个联盟的预测增益 (K,)，空联盟的增益为 0。
+        """
+        if self._from_ssr is None:
+            raise ValueError("gain_function cannot be computed from statistics alone")
+
+        masks = np.asarray(masks, dtype=bool)
+        sizes = masks.sum(axis=1)
+        ssr = np.zeros((len(masks),) + np.shape(stats.yy))
+        for k in np.unique(sizes[sizes > 0]):
+            rows = np.flatnonzero(sizes == k)
+            step = chunk_size if chunk_size is not None else max(1, 2**24 // (k * k))
+            for start in range(0, len(rows), step):
+                chunk = rows[start : start + step]
+                # 每个联盟的成员下标 (K_k, k)，按升序排列
+                members = np.nonzero(masks[chunk])[1].reshape(len(chunk), k)
+                ssr[chunk] = self._subset_ssr(stats, members, tol)
+
+        gains = self._ssr_gains(ssr, stats.yy)
+        gains[sizes == 0] = 0.0
+        return gains
+
+    def _subset_ssr(self, stats, members, tol):
+        """同样大小的一批联盟 (成员下标 (K, k)) 的残差平方和，由 Gram 子块的 Cholesky 分解求解"""
+        gram = stats.gram[members[:, :, None], members[:, None, :]]
+        xy = stats.xy[members]
+        multi_task = xy.ndim == 3
+        if not multi_task:
+            xy = xy[:, :, None]
+        diagonal = np.diagonal(gram, axis1=1, axis2=2)
+
+        ssr = np.empty((len(members), xy.shape[2]))
+        try:
+            L = np.linalg.cholesky(gram)
+            stable = np.all(np.diagonal(L, axis1=1, axis2=2) ** 2 > tol * diagonal, 1)
+        except np.linalg.LinAlgError:
+            # 整批分解失败时逐个联盟分解，只有失败的联盟改用伪逆
+            L = np.zeros_like(gram)
+            stable = np.zeros(len(members), dtype=bool)
+            for i, block in enumerate(gram):
+                try:
+                    L[i] = np.linalg.cholesky(block)
+                except np.linalg.LinAlgError:
+                    continue
+                stable[i] = np.all(np.diag(L[i]) ** 2 > tol * diagonal[i])
+
+        if np.any(stable):
+            z = np.linalg.solve(L[stable], xy[stable])
+            ssr[stable] = np.maximum(stats.yy - (z * z).sum(axis=1), 0.0)
+        if not np.all(stable):
+            unstable = ~stable
+            beta = self._pinv(gram[unstable]) @ xy[unstable]
+            explained = (xy[unstable] * beta).sum(axis=1)
+            ssr[unstable] = np.maximum(stats.yy - explained, 0.0)
+        return ssr if multi_task else ssr[:, 0]
+
+    def expected_gains(self, stats, noise_vars):
+        """
+        计算特征加入 i.i.d. 高斯噪声后的期望增益 (确定性近似)。
+
+        加噪数据的中心化 Gram 矩阵期望为 X·Xᵀ + (T-1)·σ²·I，而 X·Y 的期望不变。
+        利用 X·Xᵀ 的特征分解 QΛQᵀ，有
+        (X·Y)ᵀ (X·Xᵀ + λI)⁻¹ (X·Y) = Σ (Qᵀ·X·Y)ᵢ² / (Λᵢ + λ)，
+        因此一次分解后每个噪声水平只需 O(M) 的计算，且增益随 σ 平滑、单调变化。
+        噪声主导的方向在样本内仍会偶然拟合一部分残差，这里按其有效自由度
+        df = Σ λ / (Λᵢ + λ) 将残差缩小 (1 - df / (T-1)) 倍。
+
+        Args:
+            stats (SufficientStatistics): 原始数据的充分统计量。
+            noise_vars (np.array): 噪声方差 σ² (K,)。
+
+        Returns:
+            np.array: 每个噪声水平下的期望增益 (K,)。
+        """
+        if self._from_ssr is None:
+            raise ValueError(
+                "expected_gains requires in-sample evaluation and an SSR-based gain"
+            )
+
+        noise_vars = np.atleast_1d(np.asarray(noise_vars, dtype=float))
+        if stats.yy == 0:
+            return np.ones(len(noise_vars))
+
+        eigenvalues, projected_xy = stats.spectrum()
+        # 与伪逆一致，数值上为零的特征方向不解释任何方差
+        cutoff = max(eigenvalues.max(), 0) * len(eigenvalues) * np.finfo(float).eps
+        eigenvalues = np.where(eigenvalues > cutoff, eigenvalues, 0.0)
+        projected_xy = np.where(eigenvalues > 0, projected_xy, 0.0)
+
+        dof = stats.n_samples - 1
+        ridge = (dof * noise_vars)[:, None]
+        denominator = eigenvalues + ridge
+        with np.errstate(divide="ignore", invalid="ignore"):
+            explained = np.where(denominator > 0, projected_xy**2 / denominator, 0)
+            noise_dof = np.where(denominator > 0, ridge / denominator, 0)
+        ssr = np.maximum(stats.yy - explained.sum(axis=1), 0.0)
+        ssr *= np.maximum(1 - noise_dof.sum(axis=1) / dof, 0.0)
+        return self._ssr_gains(ssr, stats.yy)
+
+    def common_noise_gains(self, X, Y, noise, scales):
+        """
+        计算 X + s·noise 在一组缩放系数 s 下的增益 (公共随机数)。
+
+        中心化后 Gram(X + s·Z) = X·Xᵀ + s·(X·Zᵀ + Z·Xᵀ) + s²·Z·Zᵀ，
+        (X + s·Z)·Y = X·Y + s·Z·Y。交叉统计量只需计算一次并缓存，之后每个 s 只需
+        O(M²) 组装和一次 M×M 求解，无需构造任何 (M, T) 的降级数据。
+
+        Args:
+            X (np.array): 原始特征数据 (M, T)。
+            Y (np.array): 目标预测任务数据 (T,)。
+            noise (np.array): 标准正态噪声 Z (M, T)。
+            scales (np.array): 噪声缩放系数 s (K,)。
+
+        Returns:
+            np.array: 每个缩放系数对应的预测增益 (K,)。
+        """
+        scales = np.atleast_1d(np.asarray(scales, dtype=float))
+        if self._from_ssr is None:
+            # 需要逐个样本的残差或预测值，只能显式构造降级数据
+            return self.batch_gains(X + scales[:, None, None] * noise, Y)
+
+        stats = self.statistics(X, Y)
+
+        def cross_statistics():
+            Z_c = noise - noise.mean(axis=1, keepdims=True)
+            X_c = np.asarray(X, dtype=float) - stats.x_mean[:, None]
+            Y_c = np.asarray(Y, dtype=float) - stats.y_mean
+            xz = X_c @ Z_c.T
+            return xz + xz.T, Z_c @ Z_c.T, Z_c @ Y_c
+
+        xz_sym, zz, zy = self._cached(
+            ("noise", dataset_fingerprint(X, Y, noise)), cross_statistics
+        )
+        s = scales[:, None, None]
+        gram = stats.gram + s * xz_sym + s**2 * zz
+        xy = stats.xy + scales[:, None] * zy
+        ssr = self.residual_sum_of_squares(gram, xy, stats.yy)
+        return self._ssr_gains(ssr, stats.yy)
@@ -0,0 +1,176 @@
+from collections import OrderedDict
+
+import numpy as np
+from permutation_samplers import PERMUTATION_SAMPLERS
+
+
+class OnlineShapley:
+    """
+    跨交易累积的在线 Shapley 估计。
+
+    同一卖家池在相近任务上的 Shapley 值变化很小，没有必要每位买家都重新采样 K 个排列。
+    本估计器按 (卖家池, 任务族) 维护一份累积估计：每次交易只在当前数据上采样少量新的排列，
+    与已有样本加权合并后作为分配依据，单次交易的代价从 K·M 次拟合降为常数。
+    衰减因子 decay < 1 时，旧样本的权重每次交易乘以 decay，使估计能跟上数据的漂移。
+
+    累积状态保存在本对象的内存中，只有在同一进程内处理多次交易 (常驻服务) 时才有意义；
+    每次请求都启动新进程的调用方式 (如 server.js 调用 run_auction.py) 无法累积。
+    卖家池须由调用方给出稳定的标识，新的键先采样 warm_start 个排列后才用于分配。
+    """
+
+    def __init__(
+        self,
+        divider,
+        permutations_per_transaction=2,
+        decay=1.0,
+        sampler="random",
+        truncation_tol=None,
+        max_entries=1000,
+        warm_start=50,
+    ):
+        """
+        初始化在线估计器。
+
+        Args:
+            divider (RevenueDivider): 用于计算边际贡献的收益分配器 (及其增益引擎与联盟缓存)。
+            permutations_per_transaction (int): 每次交易新采样的排列数 (按采样器的块向上取整)。
+            decay (float): 每次交易时旧样本权重的衰减因子，取值 (0, 1]，1 表示不衰减。
+            sampler (str): 排列采样器，见 permutation_samplers.py。每个键保留自己的采样器，
+                Sobol 等拟随机序列在交易之间连续推进。
+            truncation_tol (float): 截断蒙特卡洛的容限，见 shapley_approx。
+            max_entries (int): 保留的 (卖家池, 任务族) 数量上限，超出时按 LRU 淘汰。
+            warm_start (int): 新建 (或因卖家数变化而重建) 的键在首次交易时采样的排列数，
+                使首个买家的分配与 shapley_approx(K=warm_start) 的精度相当。
+        """
+        if not 0 < decay <= 1:
+            raise ValueError("decay must be in (0, 1]")
+        if sampler not in PERMUTATION_SAMPLERS:
+            raise ValueError(f"Unknown sampler: {sampler}")
+        self.divider = divider
+        self.permutations_per_transaction = permutations_per_transaction
+        self.decay = decay
+        self.sampler = sampler
+        self.truncation_tol = truncation_tol
+        self.max_entries = max_entries
+        self.warm_start = warm_start
+        self._states = OrderedDict()
+
+    def __len__(self):
+        return len(self._states)
+
+    def _state(self, key, M):
+        """取出 (或新建) 某个键的累积状态，卖家数变化时重新开始"""
+        state = self._states.get(key)
+        if state is None or len(state["sum"]) != M:
+            state = {
+                "weight": 0.0,
+                "weight_sq": 0.0,
+                "sum": np.zeros(M),
+                "sum_sq": np.zeros(M),
+                "transactions": 0,
+                "blocks": PERMUTATION_SAMPLERS[self.sampler](M),
+            }
+            self._states[key] = state
+        self._states.move_to_end(key)
+        if len(self._states) > self.max_entries:
+            self._states.popitem(last=False)
+        return state
+
+    def update(self, X, Y, pool_key, task_key=None):
+        """
+        处理一次交易：在当前数据上采样新的排列并合并到累积估计中。
+
+        Args:
+            X (np.array): 所有卖家的特征数据 (M, T)。
+            Y (np.array): 当前买家的预测任务数据 (T,)。
+            pool_key: 卖家池的稳定标识 (如模型或数据集编号)。不能用数据指纹代替：
+                卖家数据每新增一行指纹就会改变，累积估计也会随之重新开始。
+            task_key: 任务族的标识，同一任务族的买家共享估计，None 表示所有任务共享。
+
+        Returns:
+            np.array: 累积的Shapley值估计 (M,)。
+        """
+        if pool_key is None:
+            raise ValueError("pool_key must be a stable identifier of the seller pool")
+        X = np.asarray(X, dtype=float)
+        Y = np.asarray(Y, dtype=float)
+        key = (pool_key, task_key)
+        M = X.shape[0]
+        state = self._state(key, M)
+
+        # 旧样本整体衰减，新样本权重为 1
+        for name in ("weight", "sum", "sum_sq"):
+            state[name] = state[name] * self.decay
+        state["weight_sq"] *= self.decay**2
+
+        sample = self.divider.marginal_sampler(X, Y, self.truncation_tol)
+        # 新的键先采样 warm_start 个排列，之后每次交易只补充少量排列
+        target = self.permutations_per_transaction
+        if state["weight"] == 0:
+            target = max(target, self.warm_start)
+        used = 0
+        while used < target:
+            # 一块内的排列可能相关，以块内平均的边际贡献作为一个样本
+            block = next(state["blocks"])
+            used += len(block)
+            marginals = np.mean([sample(permutation) for permutation in block], axis=0)
+            state["weight"] += 1.0
+            state["weight_sq"] += 1.0
+            state["sum"] += marginals
+            state["sum_sq"] += marginals**2
+        state["transactions"] += 1
+        return self.values(key)
+
+    def values(self, key, return_std=False):
+        """
+        某个 (卖家池, 任务族) 的累积Shapley值估计。
+
+        Args:
+            key (tuple): (pool_key, task_key)。
+            return_std (bool): 是否同时返回标准误 (按加权样本的有效样本数计算)。
+
+        Returns:
+            np.array: Shapley值 (M,)；return_std 为 True 时返回 (Shapley值, 标准误)。
+        """
+        state = self._states[key]
+        mean = state["sum"] / state["weight"]
+        if not return_std:
+            return mean
+        variance = np.maximum(state["sum_sq"] / state["weight"] - mean**2, 0.0)
+        effective_samples = state["weight"] ** 2 / state["weight_sq"]
+        if effective_samples <= 1:
+            return mean, np.full(len(mean), np.inf)
+        # 加权方差的无偏修正
+        variance *= effective_samples / (effective_samples - 1)
+        return mean, np.sqrt(variance / effective_samples)
+
+    def robust_update(self, X, Y, pool_key, task_key=None, lambda_param=np.log(2)):
+        """
+        处理一次交易并返回鲁棒Shapley值：累积估计乘以当前卖家数据的复制惩罚因子。
+
+        Args:
+            X (np.array): 所有卖家的特征数据 (M, T)。
+            Y (np.array): 当前买家的预测任务数据 (T,)。
+            pool_key: 卖家池的稳定标识，见 update。
+            task_key: 任务族的标识，None 表示所有任务共享。
+            lambda_param (float): 惩罚强度参数 λ。
+
+        Returns:
+            np.array: 鲁棒Shapley值 (M,)。
+        """
+        shapley_values = self.update(X, Y, pool_key, task_key)
+        return shapley_values * self.divider.replication_penalty(
+            np.asarray(X, dtype=float), lambda_param
+        )
+
+    def transactions(self, key):
+        """某个 (卖家池, 任务族) 已累积的交易次数，尚无记录时为 0"""
+        state = self._states.get(key)
+        return state["transactions"] if state is not None else 0
+
+    def clear(self, key=None):
+        """清空累积估计；指定 key 时只清除该 (卖家池, 任务族)"""
+        if key is None:
+            self._states.clear()
+        else:
+            self._states.pop(key, None)
@@ -0,0 +1,159 @@
+import numpy as np
+
+
+class RevenueIntegrator:
+    """
+    收益函数 RF* 的积分引擎。
+
+    Myerson 支付规则 r = b_n·g(b_n) - ∫_0^{b_n} g(z) dz 中的被积函数 g(z) = G(AF*(z, p_n))
+    是分段的：当 z >= p_n 时数据不降级，g(z) 恒等于全量数据的增益，所有变化都集中在
+    [0, min(p_n, b_n)] 上。因此平坦部分直接用闭式结果，其余部分用自适应 Simpson 积分，
+    直到误差估计满足给定容限或用完增益评估次数。
+
+    被积函数带有随机噪声时 (如 "sample" 模式下每个出价都重新抽取噪声)，细分无法使误差
+    下降，自适应积分总会用完评估次数，此时应改用 fixed_integrate 的固定节点规则。
+    """
+
+    def __init__(self, tol=1e-2, max_evaluations=65, initial_intervals=4):
+        """
+        初始化积分引擎。
+
+        Args:
+            tol (float): 积分结果允许的绝对误差。
+            max_evaluations (int): 单次积分中被积函数评估次数的上限。
+            initial_intervals (int): 初始均匀划分的 Simpson 区间个数。
+        """
+        self.tol = tol
+        self.max_evaluations = max_evaluations
+        self.initial_intervals = initial_intervals
+
+    def integrate(self, func, lower, upper):
+        """
+        自适应 Simpson 积分。
+
+        每一轮同时细分所有误差超标的区间，并通过一次向量化调用评估所有新节点。
+        每个区间的容限按其宽度占比分配。
+
+        Args:
+            func: 被积函数，输入 z 数组 (K,)，输出函数值数组 (K,)。
+            lower (float): 积分下限。
+            upper (float): 积分上限。
+
+        Returns:
+            tuple: (积分值, 误差估计, 被积函数评估次数)。
+        """
+        if upper <= lower:
+            return 0.0, 0.0, 0
+
+        # 每个区间以 (左端点, 宽度, 左/中/右三点的函数值) 表示
+        edges = np.linspace(lower, upper, self.initial_intervals + 1)
+        nodes = np.linspace(lower, upper, 2 * self.initial_intervals + 1)
+        values = np.asarray(func(nodes), dtype=float)
+        left = edges[:-1]
+        width = np.diff(edges)
+        f_left, f_mid, f_right = values[:-1:2], values[1::2], values[2::2]
+        evaluations = len(nodes)
+
+        integral, error = 0.0, 0.0
+        while len(left) > 0:
+            # 每个区间需要评估两个四分点
+            if evaluations + 2 * len(left) > self.max_evaluations:
+                # 评估次数用尽：按当前 Simpson 估计接受剩余区间，
+                # 误差取与梯形公式的差 (保守估计)
+                coarse = width / 6 * (f_left + 4 * f_mid + f_right)
+                trapezoid = width / 2 * (f_left + f_right)
+                integral += coarse.sum()
+                error += np.abs(coarse - trapezoid).sum()
+                break
+
+            quarter = np.asarray(
+                func(np.concatenate([left + width / 4, left + 3 * width / 4])),
+                dtype=float,
+            )
+            evaluations += len(quarter)
+            f_q1, f_q3 = quarter[: len(left)], quarter[len(left) :]
+
+            coarse = width / 6 * (f_left + 4 * f_mid + f_right)
+            fine = width / 12 * (f_left + 4 * f_q1 + 2 * f_mid + 4 * f_q3 + f_right)
+            local_error = np.abs(fine - coarse) / 15
+            accept = local_error <= self.tol * width / (upper - lower)
+
+            # Richardson 外推后的结果
+            integral += (fine + (fine - coarse) / 15)[accept].sum()
+            error += local_error[accept].sum()
+
+            # 未达到容限的区间一分为二
+            split = ~accept
+            half = width[split] / 2
+            left = np.concatenate([left[split], left[split] + half])
+            width = np.concatenate([half, half])
+            f_left, f_mid, f_right = (
+                np.concatenate([f_left[split], f_mid[split]]),
+                np.concatenate([f_q1[split], f_q3[split]]),
+                np.concatenate([f_mid[split], f_right[split]]),
+            )
+
+        return float(integral), float(error), evaluations
+
+    def fixed_integrate(self, func, lower, upper):
+        """
+        固定节点的复合 Simpson 积分，用于带噪声的被积函数。
+
+        在 [lower, upper] 上均匀取不超过 max_evaluations 的奇数个节点，一次向量化调用评估，
+        不做细分。误差估计为离散化误差 (与同一组节点上梯形公式的差) 加上抽样噪声的标准误，
+        后者由相邻节点函数值的二阶差分估计噪声方差得到。
+
+        Args:
+            func: 被积函数，输入 z 数组 (K,)，输出函数值数组 (K,)。
+            lower (float): 积分下限。
+            upper (float): 积分上限。
+
+        Returns:
+            tuple: (积分值, 误差估计, 被积函数评估次数)。
+        """
+        if upper <= lower:
+            return 0.0, 0.0, 0
+
+        num_points = max(3, self.max_evaluations - (1 - self.max_evaluations % 2))
+        nodes = np.linspace(lower, upper, num_points)
+        values = np.asarray(func(nodes), dtype=float)
+        step = nodes[1] - nodes[0]
+        weights = np.ones(num_points)
+        weights[1:-1:2], weights[2:-1:2] = 4, 2
+        simpson = step / 3 * np.dot(weights, values)
+        trapezoid = step * (values.sum() - 0.5 * (values[0] + values[-1]))
+        # 独立噪声下二阶差分 f_{i-1} - 2f_i + f_{i+1} 的方差为 6σ²，光滑部分的贡献可忽略
+        second_difference = values[2:] - 2 * values[1:-1] + values[:-2]
+        noise = np.sqrt(np.mean(second_difference**2) / 6)
+        error = abs(simpson - trapezoid) + step / 3 * noise * np.linalg.norm(weights)
+        return float(simpson), float(error), num_points
+
+    def revenue(self, gain_as_function_of_bid, p_n, b_n, adaptive=True):
+        """
+        按 Myerson 支付规则计算收益。
+
+        Args:
+            gain_as_function_of_bid: 被积函数 g(z)，输入出价数组 (K,)，输出增益数组 (K,)。
+            p_n (float): 市场价格。
+            b_n (float): 买家出价。
+            adaptive (bool): 是否使用自适应 Simpson 积分，False 时使用 fixed_integrate。
+
+        Returns:
+            tuple: (收益 (非负), 积分误差估计, 被积函数评估次数)。
+        """
+        gain_at_b_n = float(gain_as_function_of_bid(np.array([b_n]))[0])
+
+        # 变化部分 [0, min(p_n, b_n)] 数值积分
+        integrate = self.integrate if adaptive else self.fixed_integrate
+        integral_part, error, evaluations = integrate(
+            gain_as_function_of_bid, 0.0, min(p_n, b_n)
+        )
+        evaluations += 1
+
+        # 平坦部分 [p_n, b_n]：g(z) 恒等于全量数据的增益，即 g(b_n)
+        if b_n > p_n:
+            integral_part += (b_n - p_n) * gain_at_b_n
+
+        revenue = b_n * gain_at_b_n - integral_part
+
+        return float(max(0, revenue)), error, evaluations
@@ -0,0 +1,71 @@
+import numpy as np
+
+
+class SellerBlocks:
+    """
+    多列卖家的数据：每个卖家提供一个 (m_i, T) 的数据块 (如 verify_model.py 读入的整张数值表)。
+
+    各块按卖家顺序纵向拼接成特征矩阵 X (C, T)，C = Σm_i，拍卖与模型训练都在 X 上进行；
+    而收益分配以卖家为参与者，联盟 (卖家集合) 对应其全部列的并集。
+    """
+
+    def __init__(self, blocks):
+        """
+        Args:
+            blocks (list): 每个卖家的数据块 (m_i, T)，一维数组视为单列的卖家。
+        """
+        blocks = [np.atleast_2d(np.asarray(block, dtype=float)) for block in blocks]
+        if len(blocks) == 0:
+            raise ValueError("blocks must not be empty")
+        if len({block.shape[1] for block in blocks}) != 1:
+            raise ValueError("all blocks must have the same number of samples T")
+        self.sizes = np.array([len(block) for block in blocks])
+        self.X = np.vstack(blocks)
+        offsets = np.concatenate([[0], np.cumsum(self.sizes)])
+        self.rows = [np.arange(offsets[i], offsets[i + 1]) for i in range(len(blocks))]
+
+    @classmethod
+    def from_tables(cls, tables):
+        """
+        由每个卖家的数据表 (T, m_i) 构造，例如 CSV 的数值列。
+
+        Args:
+            tables (list): 每个卖家的数据表 (T, m_i)。
+
+        Returns:
+            SellerBlocks: 多列卖家的数据。
+        """
+        return cls(
+            [
+                np.asarray(table, dtype=float).reshape(len(table), -1).T
+                for table in tables
+            ]
+        )
+
+    def __len__(self):
+        return len(self.sizes)
+
+    @property
+    def shape(self):
+        """拼接后特征矩阵的形状 (C, T)"""
+        return self.X.shape
+
+    def columns(self, sellers):
+        """
+        一组卖家在 X 中对应的行下标 (按卖家给出的顺序拼接)。
+
+        Args:
+            sellers (iterable): 卖家下标。
+
+        Returns:
+            np.array: 行下标。
+        """
+        sellers = list(sellers)
+        if len(sellers) == 0:
+            return np.zeros(0, dtype=int)
+        return np.concatenate([self.rows[seller] for seller in sellers])
+
+
+def as_feature_matrix(X):
+    """SellerBlocks 转为拼接后的特征矩阵 (C, T)，普通数组原样返回"""
+    return X.X if isinstance(X, SellerBlocks) else X
@@ -0,0 +1,83 @@
+import numpy as np
+from RevenueDiver import RevenueDivider
+from OLSGainEngine import OLSGainEngine
+from permutation_samplers import PERMUTATION_SAMPLERS
+from rmse import gain_function_rmse, generate_data
+
+# 比较各排列采样器达到目标精度所需的模型拟合次数
+# 以精确Shapley值为基准，一次拟合对应一个前驱子集的增益 (每个排列 M 次)
+
+
+def fits_to_target(divider, X, Y, exact, sampler, target, max_permutations):
+    """
+    按采样器依次处理排列块，返回估计的相对误差首次不超过 target 时所用的拟合次数。
+
+    Args:
+        divider (RevenueDivider): 收益分配器。
+        X (np.array): 所有卖家的特征数据 (M, T)。
+        Y (np.array): 目标预测任务数据 (T,)。
+        exact (np.array): 精确Shapley值 (M,)。
+        sampler (str): 排列采样器名称。
+        target (float): 目标相对误差 ||估计 - 精确|| / ||精确||。
+        max_permutations (int): 排列数上限。
+
+    Returns:
+        int: 拟合次数，未达到目标时返回 None。
+    """
+    M = len(exact)
+    sample = divider.marginal_sampler(X, Y)
+    total = np.zeros(M)
+    used = 0
+    for block in PERMUTATION_SAMPLERS[sampler](M):
+        for permutation in block:
+            total += sample(permutation)
+        used += len(block)
+        error = np.linalg.norm(total / used - exact) / np.linalg.norm(exact)
+        if error <= target:
+            return used * M
+        if used >= max_permutations:
+            return None
+
+
+def run_benchmark(
+    workloads=((8, 100), (10, 100), (12, 200)),
+    target=0.05,
+    repeats=20,
+    max_permutations=5000,
+    seed=0,
+):
+    """
+    在 generate_data 生成的数据上比较各采样器，打印达到目标误差所需拟合次数的中位数与均值。
+
+    Args:
+        workloads (tuple): (M, T) 的列表。
+        target (float): 目标相对误差。
+        repeats (int): 每个采样器的重复次数。
+        max_permutations (int): 单次运行的排列数上限。
+        seed (int): 随机种子。
+    """
+    np.random.seed(seed)
+    divider = RevenueDivider(
+        None, gain_function_rmse, gain_engine=OLSGainEngine(), exact_budget=0
+    )
+    print(f"目标相对误差: {target:.0%}，每个采样器重复 {repeats} 次")
+    for M, T in workloads:
+        X, Y = generate_data(M=M, T=T)
+        exact = divider.shapley_exact(X, Y)
+        print(f"\n--- M = {M}, T = {T} ---")
+        print(f"{'采样器':<12}{'拟合次数中位数':>16}{'拟合次数均值':>14}{'未达标':>8}")
+        for sampler in PERMUTATION_SAMPLERS:
+            fits = [
+                fits_to_target(divider, X, Y, exact, sampler, target, max_permutations)
+                for _ in range(repeats)
+            ]
+            reached = [f for f in fits if f is not None]
+            median = np.median(reached) if reached else np.nan
+            mean = np.mean(reached) if reached else np.nan
+            print(
+                f"{sampler:<12}{median:>16.0f}{mean:>14.0f}{len(fits) - len(reached):>8}"
+            )
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -8,6 +8,8 @@ from rmse import gain_function_rmse, generate_data
 from sklearn.linear_model import LinearRegression
 
 whichPricer = 0  # 可以选择 "DynamicPricer"(0) 或 "UCBPricer"(1)
+# 可以选择 "Shapley"(0) 或 "Banzhaf"(1) 作为收益分配依据
+whichValuation = 0
 # 1. 初始化市场组件
 # 假设买家的估值和市场的价格都在  范围内
 price_range = (50, 500)
@@ -64,14 +66,19 @@ print(f"步骤 7: 市场价格模型权重已更新。")
 
 # 步骤 8: 市场分配收益给卖家
 print("步骤 8: 市场计算并分配收益给卖家...")
-# 使用鲁棒的Shapley值分配，设置K=50次采样
-shapley_values = divider.shapley_robust(X, Y, K=50)
+if whichValuation == 0:
+    # 使用鲁棒的Shapley值分配，设置K=50次采样
+    shapley_values = divider.shapley_robust(X, Y, K=50)
+else:
+    # 使用鲁棒的Banzhaf值分配 (最大样本复用)，联盟数与 50 次排列的边际贡献个数相同 (50·M)。
+    # 逐个拟合模型时两者耗时相当 (经联盟缓存去重后 Banzhaf 的拟合次数略多)；
+    # 若改用 OLSGainEngine，一次排列的 M 个前驱增益只需一次分解，应相应减小 K。
+    shapley_values = divider.shapley_robust(
+        X, Y, K=50 * X.shape[0], estimator="banzhaf"
+    )
 
 # 归一化Shapley值作为分配比例
-if np.sum(shapley_values) > 0:
-    allocation_ratios = shapley_values / np.sum(shapley_values)
-else:
-    allocation_ratios = np.ones(X.shape) / X.shape  # 均分
+allocation_ratios = divider.allocation_ratios(shapley_values)
 
 seller_revenues = revenue_n * allocation_ratios
 print(f"  - 计算出的Shapley值 (归一化前): {np.round(shapley_values, 4)}")
@@ -0,0 +1,121 @@
+from collections import OrderedDict
+
+
+def coalition_mask(indices):
+    """
+    将卖家下标集合编码为位掩码 (第 i 位为 1 表示卖家 i 在联盟中)。
+
+    Python 整数没有位数上限，因此任意 M 都可以使用同一种紧凑的键。
+
+    Args:
+        indices (iterable): 卖家下标。
+
+    Returns:
+        int: 位掩码。
+    """
+    mask = 0
+    for index in indices:
+        mask |= 1 << int(index)
+    return mask
+
+
+class CoalitionCache:
+    """
+    联盟价值 (联盟的预测增益) 缓存。
+
+    键为 (作用域, 位掩码)，作用域通常是 (X, Y) 的数据指纹，即同一数据集与任务下的
+    联盟价值可以在 Shapley 近似、鲁棒 Shapley 以及后续的精确或采样估计之间共享。
+    条目数超过上限时按 LRU 淘汰，并记录命中率等统计信息。
+    """
+
+    def __init__(self, max_entries=100000):
+        """
+        初始化缓存。
+
+        Args:
+            max_entries (int): 缓存条目数上限。
+        """
+        self.max_entries = max_entries
+        self._values = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._values)
+
+    def lookup(self, scope, mask):
+        """
+        查询联盟价值。
+
+        Args:
+            scope: 作用域，如数据指纹。
+            mask (int): 联盟的位掩码。
+
+        Returns:
+            float | None: 联盟价值，未命中时返回 None。
+        """
+        key = (scope, mask)
+        value = self._values.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._values.move_to_end(key)
+        return value
+
+    def store(self, scope, mask, value):
+        """写入联盟价值，超出上限时淘汰最久未使用的条目"""
+        key = (scope, mask)
+        self._values[key] = value
+        self._values.move_to_end(key)
+        if len(self._values) > self.max_entries:
+            self._values.popitem(last=False)
+            self.evictions += 1
+
+    def get_or_compute(self, scope, mask, compute):
+        """
+        读取联盟价值，未命中时调用 compute() 计算并写入。
+
+        Args:
+            scope: 作用域。
+            mask (int): 联盟的位掩码。
+            compute: 无参函数，返回联盟价值。
+
+        Returns:
+            float: 联盟价值。
+        """
+        value = self.lookup(scope, mask)
+        if value is None:
+            value = compute()
+            self.store(scope, mask, value)
+        return value
+
+    def clear(self, scope=None):
+        """清空缓存；指定 scope 时只清除该作用域的条目"""
+        if scope is None:
+            self._values.clear()
+            return
+        for key in [key for key in self._values if key[0] == scope]:
+            del self._values[key]
+
+    @property
+    def hit_rate(self):
+        """命中率，尚无查询时为 0"""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def cache_info(self):
+        """
+        缓存的统计信息。
+
+        Returns:
+            dict: 命中次数、未命中次数、淘汰次数、当前条目数与命中率。
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._values),
+            "hit_rate": self.hit_rate,
+        }
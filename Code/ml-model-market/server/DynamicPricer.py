@@ -56,16 +56,12 @@ class DynamicPricer:
             Y (np.array): 目标预测任务数据。
             b_n (float): 本轮买家的出价。
         """
-        virtual_gains = np.zeros(self.num_experts)
+        # 为每个专家计算虚拟收益：如果当时使用 expert_price，会产生的收益
+        # 所有专家价格在一次调用中计算，共享同一组增益评估
+        revenues = auction_mechanism.calculate_revenue_grid(X, Y, self.experts, b_n)
         
-        # 为每个专家计算虚拟收益
-        for i, expert_price in enumerate(self.experts):
-            # 计算如果当时使用 expert_price，会产生的收益
-            revenue = auction_mechanism.calculate_revenue(X, Y, expert_price, b_n)
-            
-            # 归一化收益
-            normalized_gain = revenue / self.B_max
-            virtual_gains[i] = normalized_gain
+        # 归一化收益
+        virtual_gains = revenues / self.B_max
             
         # 执行乘法权重更新
         # w_{n+1}^i = w_n^i * (1 + delta * g_n^i)
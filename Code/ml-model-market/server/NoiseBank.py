@@ -0,0 +1,57 @@
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+
+class NoiseBank:
+    """
+    公共随机数 (Common Random Numbers) 噪声库。
+
+    每场拍卖 (由请求编号等键标识) 只抽取一次标准正态噪声，之后不同出价下的降级数据
+    都由同一份噪声按噪声大小缩放得到。这样收益积分中的被积函数是光滑的，且同一请求
+    的结果可以复现、缓存和审计。
+    """
+
+    def __init__(self, seed=None, max_entries=32):
+        """
+        初始化噪声库。
+
+        Args:
+            seed (int): 随机种子，None 表示随机生成一个 (此后在本实例内保持不变)。
+            max_entries (int): 缓存的噪声矩阵个数上限。
+        """
+        if seed is None:
+            seed = np.random.SeedSequence().entropy
+        self.seed = seed
+        self.max_entries = max_entries
+        self._bank = OrderedDict()
+
+    def _key_to_int(self, key):
+        """将任意可 repr 的键转换为用于派生随机流的整数"""
+        digest = hashlib.blake2b(repr(key).encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "little")
+
+    def standard_normal(self, shape, key=None):
+        """
+        获取键 key 对应的标准正态噪声，同一 (key, shape) 总是返回相同的噪声。
+
+        Args:
+            shape (tuple): 噪声的形状，通常为 (M, T)。
+            key: 标识一场拍卖的键，例如请求编号。
+
+        Returns:
+            np.array: 标准正态噪声 (只读)。
+        """
+        bank_key = (key, tuple(shape))
+        noise = self._bank.get(bank_key)
+        if noise is None:
+            rng = np.random.default_rng([self.seed, self._key_to_int(bank_key)])
+            noise = rng.standard_normal(shape)
+            noise.setflags(write=False)
+            self._bank[bank_key] = noise
+            if len(self._bank) > self.max_entries:
+                self._bank.popitem(last=False)
+        else:
+            self._bank.move_to_end(bank_key)
+        return noise
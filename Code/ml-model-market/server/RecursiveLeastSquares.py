@@ -0,0 +1,194 @@
+import hashlib
+
+import numpy as np
+from OLSGainEngine import SufficientStatistics
+
+
+class RecursiveLeastSquares:
+    """
+    递推最小二乘 (RLS) 线性回归，遵循 scikit-learn API (fit / predict)，可替代 ml_model。
+
+    模型维护带截距的加权矩 A = Σ w·x̃x̃ᵀ、b = Σ w·x̃y (x̃ = [1, x]) 及 A 的逆 P，
+    新到达的一行数据通过 Sherman-Morrison 秩一更新在 O(M²) 内更新 P 与系数，
+    无需在全部 T 行历史上重新拟合。遗忘因子 λ < 1 时，越早的样本权重按 λ 的幂次衰减。
+
+    fit(X, y) 会检测 X、y 是否为上一次数据的延长 (前若干行完全相同)，是则只增量处理
+    新增的行；否则 (如加噪或换了特征子集的数据) 退化为一次完整拟合，结果与
+    LinearRegression 一致。
+    """
+
+    def __init__(self, forgetting_factor=1.0, rcond=1e-10, refresh_every=1000):
+        """
+        初始化模型。
+
+        Args:
+            forgetting_factor (float): 遗忘因子 λ ∈ (0, 1]，1 表示普通最小二乘。
+            rcond (float): A 的最小/最大特征值之比低于该阈值时视为奇异，改用伪逆求解。
+            refresh_every (int): 每处理这么多行后由 A 重新求逆一次，抑制秩一更新累积的舍入误差。
+        """
+        if not 0 < forgetting_factor <= 1:
+            raise ValueError("forgetting_factor must be in (0, 1]")
+        self.forgetting_factor = forgetting_factor
+        self.rcond = rcond
+        self.refresh_every = refresh_every
+        self._reset(None)
+
+    def _reset(self, n_features):
+        """清空模型状态"""
+        self.n_features_in_ = n_features
+        self.n_samples_seen_ = 0
+        self._rows_since_refresh = 0
+        self._x_hasher = hashlib.blake2b(digest_size=16)
+        self._y_hasher = hashlib.blake2b(digest_size=16)
+        if n_features is None:
+            self._A = self._b = self._P = self._theta = None
+            self._yy = 0.0
+            return
+        self._A = np.zeros((n_features + 1, n_features + 1))
+        self._b = np.zeros(n_features + 1)
+        self._yy = 0.0
+        self._P = None
+        self._theta = np.zeros(n_features + 1)
+
+    @staticmethod
+    def _as_arrays(X, y):
+        X = np.ascontiguousarray(X, dtype=float)
+        y = np.ascontiguousarray(y, dtype=float).ravel()
+        if X.ndim != 2 or X.shape[0] != len(y):
+            raise ValueError("X must be (T, M) and y must be (T,)")
+        return X, y
+
+    def _extends_seen_data(self, X, y):
+        """X、y 的前 n_samples_seen_ 行是否与已处理的数据完全相同"""
+        n = self.n_samples_seen_
+        if self.n_features_in_ != X.shape[1] or n == 0 or len(y) < n:
+            return False
+        x_hasher = hashlib.blake2b(X[:n].data, digest_size=16)
+        y_hasher = hashlib.blake2b(y[:n].data, digest_size=16)
+        return (
+            x_hasher.digest() == self._x_hasher.digest()
+            and y_hasher.digest() == self._y_hasher.digest()
+        )
+
+    def fit(self, X, y):
+        """
+        拟合模型。若数据是上一次数据的延长，只增量处理新增的行。
+
+        Args:
+            X (np.array): 特征 (T, M)。
+            y (np.array): 目标 (T,)。
+
+        Returns:
+            RecursiveLeastSquares: self。
+        """
+        X, y = self._as_arrays(X, y)
+        if self._extends_seen_data(X, y):
+            n = self.n_samples_seen_
+            return self.partial_fit(X[n:], y[n:])
+        self._reset(X.shape[1])
+        return self.partial_fit(X, y)
+
+    def partial_fit(self, X, y):
+        """
+        追加若干行数据并更新模型。
+
+        少量行逐行做 Sherman-Morrison 更新 (每行 O(M²))；行数不少于 M + 1 的数据块
+        则直接累加到 A、b 上后重新求逆，总代价与逐行更新同阶。
+
+        Args:
+            X (np.array): 新增的特征 (k, M)。
+            y (np.array): 新增的目标 (k,)。
+
+        Returns:
+            RecursiveLeastSquares: self。
+        """
+        X, y = self._as_arrays(X, y)
+        if self.n_features_in_ is None:
+            self._reset(X.shape[1])
+        elif X.shape[1] != self.n_features_in_:
+            raise ValueError(
+                f"X has {X.shape[1]} features, expected {self.n_features_in_}"
+            )
+        if len(y) == 0:
+            return self
+
+        self._x_hasher.update(X.data)
+        self._y_hasher.update(y.data)
+        self.n_samples_seen_ += len(y)
+        self._rows_since_refresh += len(y)
+        X_aug = np.hstack([np.ones((len(y), 1)), X])
+
+        if self._P is None or len(y) > self.n_features_in_:
+            self._accumulate(X_aug, y)
+            self._solve()
+        else:
+            for x, target in zip(X_aug, y):
+                self._rank_one_update(x, target)
+            if self._rows_since_refresh >= self.refresh_every:
+                self._solve()
+
+        self.coef_ = self._theta[1:].copy()
+        self.intercept_ = float(self._theta[0])
+        return self
+
+    def _accumulate(self, X_aug, y):
+        """将一个数据块按遗忘权重累加到 A、b、Σy² 上"""
+        lam = self.forgetting_factor
+        weights = lam ** np.arange(len(y) - 1, -1, -1, dtype=float)
+        decay = lam ** len(y)
+        self._A = decay * self._A + (X_aug * weights[:, None]).T @ X_aug
+        self._b = decay * self._b + X_aug.T @ (weights * y)
+        self._yy = decay * self._yy + float(weights @ (y * y))
+
+    def _rank_one_update(self, x, target):
+        """单行数据的 RLS 更新：P ← (P - P·x̃·x̃ᵀ·P / (λ + x̃ᵀ·P·x̃)) / λ"""
+        lam = self.forgetting_factor
+        self._A = lam * self._A + np.outer(x, x)
+        self._b = lam * self._b + target * x
+        self._yy = lam * self._yy + target * target
+
+        Px = self._P @ x
+        gain = Px / (lam + x @ Px)
+        self._theta = self._theta + gain * (target - x @ self._theta)
+        self._P = (self._P - np.outer(gain, Px)) / lam
+
+    def _solve(self):
+        """由 A、b 重新求解系数；A 奇异时按中心化数据取最小范数解 (与 LinearRegression 一致)"""
+        self._rows_since_refresh = 0
+        eigenvalues, eigenvectors = np.linalg.eigh(self._A)
+        if eigenvalues[0] > self.rcond * eigenvalues[-1]:
+            self._P = (eigenvectors / eigenvalues) @ eigenvectors.T
+            self._theta = self._P @ self._b
+            return
+
+        self._P = None
+        stats = self.statistics()
+        coef = np.linalg.pinv(stats.gram, hermitian=True) @ stats.xy
+        self._theta = np.concatenate([[stats.y_mean - stats.x_mean @ coef], coef])
+
+    def predict(self, X):
+        """
+        预测目标值。
+
+        Args:
+            X (np.array): 特征 (T, M)。
+
+        Returns:
+            np.array: 预测值 (T,)。
+        """
+        return np.asarray(X, dtype=float) @ self.coef_ + self.intercept_
+
+    def statistics(self):
+        """
+        当前 (加权) 数据的中心化充分统计量，可直接交给 OLSGainEngine.gain_from_statistics。
+
+        Returns:
+            SufficientStatistics: 充分统计量，n_samples 为有效样本数 Σw。
+        """
+        n = self._A[0, 0]
+        x_mean = self._A[0, 1:] / n
+        y_mean = self._b[0] / n
+        gram = self._A[1:, 1:] - n * np.outer(x_mean, x_mean)
+        xy = self._b[1:] - n * x_mean * y_mean
+        yy = self._yy - n * y_mean**2
+        return SufficientStatistics.from_moments(n, x_mean, y_mean, gram, xy, yy)
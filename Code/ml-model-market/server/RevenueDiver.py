@@ -1,21 +1,80 @@
+import time
+
 import numpy as np
+from scipy.linalg import cho_solve, solve_triangular
+from scipy.special import gammaln
+from scipy.stats import norm
+from sklearn.cluster import KMeans
 from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.preprocessing import normalize
 from shared import ml_model, price_range
+from OLSGainEngine import dataset_fingerprint
+from CoalitionCache import CoalitionCache, coalition_mask
+from permutation_samplers import PERMUTATION_SAMPLERS
+from SellerBlocks import SellerBlocks
 
 class RevenueDivider:
     """
     实现了基于Shapley值的收益分配机制，包括近似算法和对复制鲁棒的算法。
     """
-    def __init__(self, ml_model, gain_function):
+    def __init__(
+        self,
+        ml_model,
+        gain_function,
+        gain_engine=None,
+        coalition_cache=None,
+        exact_budget=1e7,
+    ):
         """
         初始化收益分配器。
 
         Args:
             ml_model: 一个遵循 scikit-learn API 的机器学习模型实例。
             gain_function: 一个函数，输入 (y_true, y_pred)，输出预测增益 G。
+            gain_engine: 可选的增益引擎 (如 OLSGainEngine)，提供时替代 ml_model + gain_function 计算增益。
+                若其增益可由残差平方和得到，shapley_approx 沿排列逐列扩展 Cholesky 分解，
+                每个前驱子集的增益由一次秩一扩展得到，无需重新拟合模型。
+            coalition_cache (CoalitionCache): 联盟价值缓存，按 (估值方式, (X, Y) 的数据指纹) 划分作用域，
+                在本分配器的各个 Shapley 估计之间共享；估值方式 (模型、增益函数、评估方式) 不同的分配器
+                共用同一个缓存时互不干扰。None 表示创建一个默认的缓存。
+            exact_budget (float): 精确 Shapley 值的计算量预算。提供了可由残差平方和计算增益的
+                gain_engine 且 2^M·M² 不超过该预算时，shapley_approx 自动改为计算精确值，0 表示禁用。
         """
         self.ml_model = ml_model
         self.gain_function = gain_function
+        self.gain_engine = gain_engine
+        self.coalition_cache = (
+            coalition_cache if coalition_cache is not None else CoalitionCache()
+        )
+        self.exact_budget = exact_budget
+        # shapley_incremental 保存的卖家池状态，供 add_seller / remove_seller 增量更新
+        self.pool_state = None
+
+    def _cache_scope(self, *arrays):
+        """
+        辅助函数：联盟缓存的作用域 = (估值方式, 数据指纹)
+
+        缓存的增益不仅取决于数据，也取决于模型、增益函数与增益引擎的评估方式，
+        因此共享缓存的分配器只有在估值方式相同时才会复用彼此的结果。
+        """
+        engine = self.gain_engine
+        if engine is not None:
+            valuation = (
+                type(engine).__name__,
+                getattr(engine, "gain_function", None),
+                getattr(engine, "evaluation", None),
+                getattr(engine, "holdout_fraction", None),
+                getattr(engine, "seed", None),
+                getattr(engine, "rcond", None),
+            )
+        else:
+            valuation = (repr(self.ml_model), self.gain_function)
+        return valuation, dataset_fingerprint(*arrays)
+
+    @property
+    def _supports_ssr(self):
+        """是否提供了可由残差平方和计算增益的 gain_engine (可走充分统计量的快速路径)"""
+        return self.gain_engine is not None and self.gain_engine.supports_ssr
 
     def _get_gain_for_subset(self, X_subset, Y):
         """
@@ -24,6 +83,9 @@ class RevenueDivider:
         if X_subset.shape == 0: # 如果子集为空
             return 0.0
         
+        if self.gain_engine is not None:
+            return self.gain_engine.gain(X_subset, Y)
+
         X_train = X_subset.T
         y_train = Y
         
@@ -31,86 +93,1308 @@ class RevenueDivider:
         y_pred = self.ml_model.predict(X_train)
         return self.gain_function(y_train, y_pred)
 
-    def shapley_approx(self, X, Y, K):
+    def _get_gain_for_coalition(self, X, Y, scope, indices, mask):
+        """
+        辅助函数：带缓存地计算联盟 (卖家下标 indices，位掩码 mask) 的预测增益，空联盟的增益为 0
+        """
+        if mask == 0:
+            return 0.0
+        return self.coalition_cache.get_or_compute(
+            scope, mask, lambda: self._get_gain_for_subset(X[indices], Y)
+        )
+
+    def _permutation_gains(self, stats, permutation, tol=1e-10, return_factor=False):
+        """
+        按排列顺序依次加入卖家，计算每个前驱子集 (前 1, 2, ..., M 个卖家) 的增益。
+
+        对排列后的中心化 Gram 矩阵做 Cholesky 分解 L·Lᵀ，L 的第 k 行正是加入第 k 个卖家时
+        对前 k - 1 列分解的秩一扩展。令 L·z = X·Y，则前 k 个卖家的残差平方和为
+        SSR_k = Yᵀ·Y - Σ_{i<=k} z_i²。与已选卖家 (近似) 共线的卖家不改变残差，边际贡献为 0。
+        多任务统计量 (xy 为 (M, B)) 共用同一个分解，一次三角求解得到所有任务的 z。
+
+        Args:
+            stats (SufficientStatistics): 全部卖家数据的充分统计量。
+            permutation (np.array): 卖家的排列 (M,)。
+            tol (float): 新列与已选列张成空间的相对距离平方低于该值时视为共线。
+            return_factor (bool): 是否同时返回 z 与 Cholesky 因子 L (存在共线卖家时 L 为 None)。
+
+        Returns:
+            np.array: 每个前驱子集的增益 (M,) 或 (M, B)；return_factor 为 True 时返回 (增益, z, L)。
+        """
+        gram = stats.gram[np.ix_(permutation, permutation)]
+        xy = stats.xy[permutation]
+        diagonal = np.diag(gram)
+
+        try:
+            L = np.linalg.cholesky(gram)
+            well_conditioned = np.all(np.diag(L) ** 2 > tol * diagonal)
+        except np.linalg.LinAlgError:
+            well_conditioned = False
+
+        if well_conditioned:
+            z = solve_triangular(L, xy, lower=True)
+        else:
+            # 存在共线的卖家：逐列扩展分解，跳过落在已选列张成空间内的列
+            M = len(permutation)
+            L = np.zeros((M, M))
+            active = []
+            z = np.zeros(xy.shape)
+            for k in range(M):
+                r = len(active)
+                l = solve_triangular(L[:r, :r], gram[active, k], lower=True)
+                d2 = diagonal[k] - l @ l
+                if d2 <= tol * diagonal[k]:
+                    continue
+                d = np.sqrt(d2)
+                L[r, :r] = l
+                L[r, r] = d
+                z[k] = (xy[k] - l @ z[active]) / d
+                active.append(k)
+            L = None
+
+        gains = self._gains_from_projections(stats, z)
+        return (gains, z, L) if return_factor else gains
+
+    def _gains_from_projections(self, stats, z):
+        """由 L·z = X·Y 的解 z 计算各前驱子集的增益：SSR_k = Yᵀ·Y - Σ_{i<=k} z_i²"""
+        ssr = np.maximum(stats.yy - np.cumsum(z**2, axis=0), 0.0)
+        return self.gain_engine.gains_from_ssr(np.minimum.accumulate(ssr), stats.yy)
+
+    def _all_coalition_gains(self, stats, refresh_every=256, jitter=1e-10):
+        """
+        按 Gray 码顺序枚举全部 2^M 个联盟，计算每个联盟的增益。
+
+        相邻两个 Gray 码只相差一个卖家，因此只需对当前联盟的 Gram 逆矩阵 P 做一次
+        加入 (分块求逆) 或移除 (Schur 补) 的更新，每步 O(M²)。解释平方和
+        (X·Y)ᵀ P (X·Y) 随之更新，SSR = Yᵀ·Y - 解释平方和。
+        为使共线或重复的卖家也能稳定更新，Gram 矩阵对角线加上相对大小为 jitter 的扰动，
+        并每隔 refresh_every 步重新求逆以抑制累积误差。
+        多任务统计量 (xy 为 (M, B)) 的各任务共用 P 的更新，beta 与解释平方和按列并行更新。
+
+        Args:
+            stats (SufficientStatistics): 全部卖家数据的充分统计量。
+            refresh_every (int): 重新求逆的步数间隔。
+            jitter (float): 对角扰动相对于平均对角元的大小。
+
+        Returns:
+            np.array: 各联盟的增益 (2^M,) 或 (2^M, B)，下标为联盟的位掩码。
+        """
+        M = len(stats.xy)
+        gram = stats.gram + jitter * max(np.trace(stats.gram) / M, 1e-300) * np.eye(M)
+        xy = stats.xy
+
+        explained = np.zeros((2**M,) + xy.shape[1:])
+        # 当前联盟的卖家依次占据 P、beta 的前 k 行/列，active[:k] 记录对应的卖家
+        P = np.zeros((M, M))
+        beta = np.zeros(xy.shape)
+        active = np.zeros(M, dtype=int)
+        position = np.zeros(M, dtype=int)
+        k = 0
+        current = 0.0
+        mask = 0
+        for step in range(1, 2**M):
+            # 第 step 个 Gray 码与上一个相差的位即 step 的最低位 1
+            seller = (step & -step).bit_length() - 1
+            mask ^= 1 << seller
+
+            if mask >> seller & 1:
+                # 加入卖家：分块求逆
+                b = gram[active[:k], seller]
+                u = P[:k, :k] @ b
+                d = gram[seller, seller] - b @ u
+                c = (xy[seller] - b @ beta[:k]) / d
+                P[:k, :k] += np.outer(u / d, u)
+                P[:k, k] = P[k, :k] = -u / d
+                P[k, k] = 1 / d
+                beta[:k] -= np.multiply.outer(u, c)
+                beta[k] = c
+                active[k] = seller
+                position[seller] = k
+                k += 1
+                current += c * c * d
+            else:
+                # 移除卖家：先与最后一个位置交换，再对 P 做 Schur 补
+                p, last = position[seller], k - 1
+                if p != last:
+                    P[[p, last], :k] = P[[last, p], :k]
+                    P[:k, [p, last]] = P[:k, [last, p]]
+                    beta[[p, last]] = beta[[last, p]]
+                    active[p] = active[last]
+                    position[active[p]] = p
+                k = last
+                pivot = P[k, k]
+                column = P[:k, k].copy()
+                P[:k, :k] -= np.outer(column / pivot, column)
+                current -= beta[k] ** 2 / pivot
+                beta[:k] -= np.multiply.outer(column, beta[k] / pivot)
+
+            if step % refresh_every == 0 and k > 0:
+                sellers = active[:k]
+                P[:k, :k] = np.linalg.inv(gram[np.ix_(sellers, sellers)])
+                beta[:k] = P[:k, :k] @ xy[sellers]
+                current = np.einsum("i...,i...->...", xy[sellers], beta[:k])
+            explained[mask] = current
+
+        ssr = np.maximum(stats.yy - explained, 0.0)
+        gains = self.gain_engine.gains_from_ssr(ssr, stats.yy)
+        gains[0] = 0.0
+        return gains
+
+    def shapley_exact(self, X, Y):
         """
-        近似Shapley值 (Algorithm 2: SHAPLEY-APPROX)。
+        精确Shapley值：φ_i = Σ_{S ⊆ N \\ {i}} |S|!(M - |S| - 1)!/M! · (v(S ∪ {i}) - v(S))
+
+        全部联盟的增益由 Gray 码枚举得到，再用一次向量化的加权求和得到所有卖家的 Shapley 值。
+        需要提供可由残差平方和计算增益的 gain_engine，计算量约为 2^M·M²。
 
         Args:
-            X (np.array): 所有卖家的特征数据 (M, T)。
-            Y (np.array): 目标预测任务数据 (T,)。
-            K (int): 蒙特卡洛采样的迭代次数。
+            X (np.array): 所有卖家的特征数据 (M, T)
+            Y (np.array): 目标预测任务数据 (T,)，或 B 个任务堆叠成的 (T, B)
 
         Returns:
-            np.array: 每个卖家的近似Shapley值 (M,)。
+            np.array: 每个卖家的精确Shapley值 (M,)，多任务时为 (M, B)
         """
+        if not self._supports_ssr:
+            raise ValueError("shapley_exact requires a gain_engine with an SSR form")
+
         M, T = X.shape
-        shapley_values = np.zeros(M)
-        
-        for _ in range(K):
-            # 随机生成一个特征排列
-            permutation = np.random.permutation(M)
-            
-            # 计算全集增益，用于最后一个特征的边际贡献计算
-            gain_full_set = self._get_gain_for_subset(X, Y)
-            
-            # 初始化前驱子集的增益
-            gain_predecessors = 0.0
-            
-            for i in range(M):
-                feature_idx = permutation[i]
-                
-                # 获取当前特征之前的所有特征
-                predecessor_indices = permutation[:i]
-                
-                # 计算加入当前特征后的增益
-                current_subset_indices = np.append(predecessor_indices, feature_idx)
-                gain_current = self._get_gain_for_subset(X[current_subset_indices], Y)
-                
-                # 计算边际贡献
-                marginal_contribution = gain_current - gain_predecessors
-                shapley_values[feature_idx] += marginal_contribution
-                
-                # 更新前驱子集的增益
-                gain_predecessors = gain_current
-                
-        # 取平均值
-        shapley_values /= K
-        return shapley_values
-
-    def shapley_robust(self, X, Y, K, lambda_param=np.log(2)):
-        """
-        对复制鲁棒的Shapley值分配 (Algorithm 3: SHAPLEY-ROBUST)。
-
-        Args:
-            X (np.array): 所有卖家的特征数据 (M, T)。
-            Y (np.array): 目标预测任务数据 (T,)。
-            K (int): 蒙特卡洛采样的迭代次数。
-            lambda_param (float): 指数惩罚项的强度参数。
-
-        Returns:
-            np.array: 每个卖家的鲁棒Shapley值 (M,)。
+        gains = self._all_coalition_gains(self.gain_engine.statistics(X, Y))
+        return self._shapley_from_gains(gains, M)
+
+    def _shapley_from_gains(self, gains, M):
         """
-        # 1. 计算近似Shapley值
-        approx_shapley = self.shapley_approx(X, Y, K)
-        
+        辅助函数：由全部 2^M 个联盟的增益 (下标为位掩码) 做一次向量化的加权求和，得到精确Shapley值
+        """
+        masks = np.arange(2**M)
+        members = (masks[:, None] >> np.arange(M)) & 1 == 1  # (2^M, M)
+        sizes = members.sum(axis=1)
+
+        # w(s) = s!(M - s - 1)!/M!，s = 0, ..., M - 1
+        s = np.arange(M)
+        weights = np.exp(gammaln(s + 1) + gammaln(M - s) - gammaln(M + 1))
+        # 含 i 的联盟 S 以权重 w(|S| - 1) 计正项，不含 i 的联盟以 w(|S|) 计负项
+        with_weight = np.where(sizes > 0, weights[np.maximum(sizes - 1, 0)], 0.0)
+        without_weight = np.where(sizes < M, weights[np.minimum(sizes, M - 1)], 0.0)
+        # 多任务时 gains 为 (2^M, B)，权重按行广播
+        with_weight = with_weight.reshape((-1,) + (1,) * (gains.ndim - 1))
+        without_weight = without_weight.reshape(with_weight.shape)
+        return members.T @ (with_weight * gains) - (~members).T @ (
+            without_weight * gains
+        )
+
+    def _use_exact(self, M):
+        """是否用精确 Shapley 值代替蒙特卡洛近似"""
+        return self._supports_ssr and 2**M * M**2 <= self.exact_budget
+
+    def _permutation_marginals(
+        self,
+        X,
+        Y,
+        permutation,
+        stats=None,
+        scope=None,
+        full_gain=None,
+        truncation_tol=None,
+    ):
+        """
+        辅助函数：按排列顺序依次加入卖家，返回各卖家的边际贡献 (按排列顺序排列)
+
+        提供 stats 时由充分统计量一次得到所有前驱子集的增益，否则逐个子集计算 (带缓存)。
+        提供 truncation_tol 时，前驱子集的增益与全集增益 full_gain 之差不超过该值后即截断，
+        其后卖家的边际贡献记为 0，不再计算对应子集的增益。
+        """
+        if stats is not None:
+            gains = self._permutation_gains(stats, permutation)
+            if truncation_tol is not None:
+                saturated = np.flatnonzero(np.abs(full_gain - gains) <= truncation_tol)
+                if len(saturated) > 0:
+                    gains[saturated[0] :] = gains[saturated[0]]
+            return np.diff(gains, prepend=0.0)
+
+        M = len(permutation)
+        marginals = np.zeros(M)
+
+        # 初始化前驱子集的增益
+        gain_predecessors = 0.0
+        mask = 0
+
+        for i in range(M):
+            feature_idx = permutation[i]
+
+            # 获取当前特征之前的所有特征
+            predecessor_indices = permutation[:i]
+
+            # 计算加入当前特征后的增益
+            current_subset_indices = np.append(predecessor_indices, feature_idx)
+            mask |= 1 << int(feature_idx)
+            gain_current = self._get_gain_for_coalition(
+                X, Y, scope, current_subset_indices, mask
+            )
+
+            # 计算边际贡献
+            marginals[i] = gain_current - gain_predecessors
+
+            # 更新前驱子集的增益
+            gain_predecessors = gain_current
+
+            # 增益已接近全集增益：后续卖家的边际贡献可以忽略，截断该排列
+            if (
+                truncation_tol is not None
+                and abs(full_gain - gain_current) <= truncation_tol
+            ):
+                break
+
+        return marginals
+
+    def _marginal_function(self, X, Y, truncation_tol=None):
+        """
+        辅助函数：返回 permutation -> 各卖家边际贡献 (按排列顺序) 的函数，供排列采样使用
+
+        有可由残差平方和计算增益的 gain_engine 时充分统计量只计算一次，否则联盟价值按缓存作用域复用；
+        提供 truncation_tol 时同时计算全集增益。
+        """
+        M = X.shape[0]
+        stats = scope = full_gain = None
+        if self._supports_ssr:
+            # 充分统计量只需计算一次，每个排列的代价约为一次 M×M 的 Cholesky 分解
+            stats = self.gain_engine.statistics(X, Y)
+            if truncation_tol is not None:
+                full_gain = self.gain_engine.gain_from_statistics(stats)
+        else:
+            # 同一数据集与任务下的联盟价值在各次排列之间复用
+            scope = self._cache_scope(X, Y)
+            if truncation_tol is not None:
+                full_gain = self._get_gain_for_coalition(
+                    X, Y, scope, np.arange(M), coalition_mask(range(M))
+                )
+
+        def permutation_marginals(permutation):
+            return self._permutation_marginals(
+                X, Y, permutation, stats, scope, full_gain, truncation_tol
+            )
+
+        return permutation_marginals
+
+    def marginal_sampler(self, X, Y, truncation_tol=None):
+        """
+        返回一个函数：输入一个卖家排列，输出沿该排列各卖家的边际贡献 (按卖家下标排列)。
+
+        供在 shapley_approx 之外自行组织排列采样的调用方 (如 OnlineShapley 跨交易累积、
+        benchmark_shapley.py 比较采样器) 使用，与 shapley_approx 共用增益引擎与联盟缓存。
+
+        Args:
+            X (np.array): 所有卖家的特征数据 (M, T)
+            Y (np.array): 目标预测任务数据 (T,)
+            truncation_tol (float): 截断蒙特卡洛的容限，见 shapley_approx
+
+        Returns:
+            function: permutation (M,) -> 边际贡献 (M,)，第 i 个元素对应卖家 i
+        """
+        permutation_marginals = self._marginal_function(X, Y, truncation_tol)
+        M = X.shape[0]
+
+        def sample(permutation):
+            marginals = np.zeros(M)
+            marginals[permutation] = permutation_marginals(permutation)
+            return marginals
+
+        return sample
+
+    @staticmethod
+    def _block_marginals(block, permutation_marginals, shape):
+        """
+        辅助函数：一块排列中各卖家边际贡献的块内平均
+
+        Args:
+            block (list): 排列块。
+            permutation_marginals: 输入排列，返回按排列顺序的边际贡献 (M,) 或 (M, B)。
+            shape (tuple): 结果的形状 (M,) 或 (M, B)。
+        """
+        marginals = np.zeros(shape)
+        for permutation in block:
+            marginals[permutation] += permutation_marginals(permutation)
+        return marginals / len(block)
+
+    def _sample_permutations(
+        self,
+        shape,
+        K,
+        sampler,
+        permutation_marginals,
+        tol=None,
+        confidence=0.95,
+        time_budget=None,
+        min_permutations=10,
+    ):
+        """
+        辅助函数：按采样器逐块采样排列，用 Welford 算法在线更新边际贡献的均值与方差
+
+        给定 tol 时，一旦所有卖家置信区间的半宽都不超过 tol 即提前停止，给定 time_budget 时超时也会停止。
+
+        Args:
+            shape (tuple): 边际贡献的形状 (M,) 或 (M, B)，M 为参与者数
+            K (int): 排列数上限
+            sampler (str): 排列采样器，见 permutation_samplers.py
+            permutation_marginals: 输入排列，返回按排列顺序的边际贡献
+            tol, confidence, time_budget, min_permutations: 提前停止的条件，见 shapley_approx
+
+        Returns:
+            tuple: (均值, 标准误)，均为 shape 形状
+        """
+        if sampler not in PERMUTATION_SAMPLERS:
+            raise ValueError(f"Unknown sampler: {sampler}")
+
+        z = norm.ppf(0.5 + confidence / 2)
+        start = time.perf_counter()
+        mean = np.zeros(shape)
+        m2 = np.zeros(shape)
+        n = 0
+        used = 0
+        for block in PERMUTATION_SAMPLERS[sampler](shape[0]):
+            if used >= K:
+                break
+            # 一块内的排列可能相关，以块内平均的边际贡献作为一个样本
+            block = block[: K - used]
+            used += len(block)
+            marginals = self._block_marginals(block, permutation_marginals, shape)
+
+            # Welford 在线更新均值与二阶中心矩
+            n += 1
+            delta = marginals - mean
+            mean += delta / n
+            m2 += delta * (marginals - mean)
+
+            if tol is not None and n >= 2 and used >= min_permutations:
+                half_width = z * np.sqrt(m2 / (n - 1) / n)
+                if np.all(half_width <= tol):
+                    break
+            if time_budget is not None and time.perf_counter() - start >= time_budget:
+                break
+
+        std_error = np.sqrt(m2 / (n - 1) / n) if n > 1 else np.full(shape, np.inf)
+        return mean, std_error
+
+    def shapley_approx(
+        self,
+        X,
+        Y,
+        K,
+        tol=None,
+        confidence=0.95,
+        time_budget=None,
+        min_permutations=10,
+        return_std=False,
+        sampler="random",
+        truncation_tol=None,
+    ):
+        """
+        近似Shapley值 (Algorithm 2: SHAPLEY-APPROX)
+
+        若 2^M·M² 不超过 exact_budget (且 gain_engine 可由残差平方和计算增益)，直接返回精确Shapley值。
+        每个卖家边际贡献的均值与方差用 Welford 算法在线更新；给定 tol 时，一旦所有卖家置信区间
+        的半宽都不超过 tol 即提前停止，给定 time_budget 时超时也会停止。
+
+        Args:
+            X (np.array): 所有卖家的特征数据 (M, T)
+            Y (np.array): 目标预测任务数据 (T,)
+            K (int): 蒙特卡洛采样的迭代次数 (给定 tol 或 time_budget 时为上限)
+            tol (float): 置信区间半宽的目标值，None 表示不提前停止
+            confidence (float): 置信区间的置信水平
+            time_budget (float): 采样的时间预算 (秒)，None 表示不限时
+            min_permutations (int): 按 tol 提前停止前至少采样的排列数
+            return_std (bool): 是否同时返回标准误
+            sampler (str): 排列采样器，"random"、"antithetic"、"stratified" 或 "sobol"，
+                见 permutation_samplers.py
+            truncation_tol (float): 截断蒙特卡洛 (TMC-Shapley) 的容限。全集增益每次调用只计算一次，
+                排列中前驱子集的增益与其相差不超过该值后即截断，None 表示不截断
+
+        Returns:
+            np.array: 每个卖家的近似Shapley值 (M,)；return_std 为 True 时返回 (Shapley值, 标准误)，
+                精确值的标准误为 0
+        """
+        if sampler not in PERMUTATION_SAMPLERS:
+            raise ValueError(f"Unknown sampler: {sampler}")
+
         M, T = X.shape
-        robust_shapley = np.zeros(M)
-        
-        # 计算所有特征之间的余弦相似度矩阵
-        # X shape is (M, T), cosine_similarity expects (n_samples, n_features)
-        similarity_matrix = cosine_similarity(X)
-        
-        # 2. 应用指数惩罚
-        for m in range(M):
-            # 计算特征 m 与所有其他特征的总相似度
-            # similarity_matrix[m] 是 m 与所有特征的相似度向量
-            # np.sum(...) - 1 是因为要排除与自身的相似度（为1）
-            total_similarity = np.sum(similarity_matrix[m]) - 1
-            
-            # 计算惩罚因子
-            penalty_factor = np.exp(-lambda_param * total_similarity)
-            
-            # 应用惩罚
-            robust_shapley[m] = approx_shapley[m] * penalty_factor
+
+        if self._use_exact(M):
+            # 卖家较少时直接计算精确值，既无采样误差，计算量也不超过预算
+            shapley_values = self.shapley_exact(X, Y)
+            return (shapley_values, np.zeros(M)) if return_std else shapley_values
+
+        mean, std_error = self._sample_permutations(
+            (M,),
+            K,
+            sampler,
+            self._marginal_function(X, Y, truncation_tol),
+            tol,
+            confidence,
+            time_budget,
+            min_permutations,
+        )
+        return (mean, std_error) if return_std else mean
+
+    def _multi_target_gains(self, X, Ys, permutation):
+        """
+        辅助函数：不使用 gain_engine 时，按排列逐个前驱子集拟合一次多输出模型，
+        得到所有任务的增益 (M, B)。同一子集上的 B 个任务共用一次拟合 (同一设计矩阵的分解)。
+        模型不接受二维目标时 (如 RecursiveLeastSquares) 退化为逐个任务拟合。
+        """
+        M, B = len(permutation), Ys.shape[1]
+        gains = np.zeros((M, B))
+        multi_output = True
+        for i in range(M):
+            X_train = X[permutation[: i + 1]].T
+            Y_pred = None
+            if multi_output:
+                try:
+                    self.ml_model.fit(X_train, Ys)
+                    Y_pred = np.reshape(self.ml_model.predict(X_train), Ys.shape)
+                except ValueError:
+                    multi_output = False
+            if Y_pred is None:
+                Y_pred = np.column_stack(
+                    [
+                        self.ml_model.fit(X_train, Ys[:, b]).predict(X_train)
+                        for b in range(B)
+                    ]
+                )
+            gains[i] = [self.gain_function(Ys[:, b], Y_pred[:, b]) for b in range(B)]
+        return gains
+
+    def shapley_multi_target(
+        self, X, Ys, K, return_std=False, sampler="random", lambda_param=None
+    ):
+        """
+        多任务批量Shapley值：同一卖家集合、B 个买家任务一次估计
+
+        OLS 对不同目标 Y 的拟合共享同一个设计矩阵，因此每个前驱子集 (联盟) 的分解只需计算一次，
+        所有任务的增益由同一个分解得到：有可由残差平方和计算增益的 gain_engine 时，每个排列
+        一次 Cholesky 分解加一次 (M, B) 的三角求解；卖家较少时 (见 exact_budget) 直接由
+        Gray 码枚举计算精确值。否则每个前驱子集拟合一次多输出模型。
+        各任务使用同一组排列，单个任务的代价约为单独估计的 1/B。
+
+        Args:
+            X (np.array): 所有卖家的特征数据 (M, T)
+            Ys (np.array): B 个买家任务堆叠成的目标数据 (T, B)
+            K (int): 蒙特卡洛采样的排列数
+            return_std (bool): 是否同时返回标准误
+            sampler (str): 排列采样器，见 permutation_samplers.py
+            lambda_param (float): 提供时返回鲁棒Shapley值 (见 shapley_robust)，None 返回近似Shapley值
+
+        Returns:
+            np.array: Shapley值矩阵 (B, M)；return_std 为 True 时返回 (Shapley值, 标准误)
+        """
+        if sampler not in PERMUTATION_SAMPLERS:
+            raise ValueError(f"Unknown sampler: {sampler}")
+        X = np.asarray(X, dtype=float)
+        Ys = np.asarray(Ys, dtype=float)
+        if Ys.ndim != 2 or Ys.shape[0] != X.shape[1]:
+            raise ValueError("Ys must be (T, B) with T matching X")
+
+        M, T = X.shape
+        B = Ys.shape[1]
+        use_engine = self._supports_ssr
+        if self._use_exact(M):
+            shapley_values = self.shapley_exact(X, Ys).T
+            std_error = np.zeros((B, M))
+        else:
+            if use_engine:
+                stats = self.gain_engine.statistics(X, Ys)
+
+            def permutation_marginals(permutation):
+                if use_engine:
+                    gains = self._permutation_gains(stats, permutation)
+                else:
+                    gains = self._multi_target_gains(X, Ys, permutation)
+                return np.diff(gains, axis=0, prepend=0.0)
+
+            mean, std_error = self._sample_permutations(
+                (M, B), K, sampler, permutation_marginals
+            )
+            shapley_values, std_error = mean.T, std_error.T
+
+        if lambda_param is not None:
+            # 复制惩罚只取决于卖家数据，所有任务共用
+            penalty_factors = self.replication_penalty(X, lambda_param)
+            shapley_values = shapley_values * penalty_factors
+            std_error = std_error * penalty_factors
+        return (shapley_values, std_error) if return_std else shapley_values
+
+    def _coalition_gains(self, X, Y, masks):
+        """
+        辅助函数：计算一批联盟 (成员矩阵 masks (K, M)) 的增益
+
+        gain_engine 可由残差平方和计算增益时批量求解，否则逐个联盟计算 (带缓存)。
+        """
+        if self._supports_ssr:
+            return self.gain_engine.coalition_gains(
+                self.gain_engine.statistics(X, Y), masks
+            )
+
+        scope = self._cache_scope(X, Y)
+        gains = np.zeros(len(masks))
+        for k, members in enumerate(masks):
+            indices = np.flatnonzero(members)
+            gains[k] = self._get_gain_for_coalition(
+                X, Y, scope, indices, coalition_mask(indices)
+            )
+        return gains
+
+    def shapley_kernel(self, X, Y, K, paired=True, return_std=False):
+        """
+        KernelSHAP 式的加权回归估计
+
+        Shapley值是约束加权最小二乘问题
+        min Σ_S w(S)·(v(S) - Σ_{i∈S} φ_i)²，s.t. Σφ_i = v(N)
+        的解，其中 w(S) ∝ (M-1) / (C(M,|S|)·|S|·(M-|S|))。按该权重抽样 K 个联盟后各样本等权，
+        由 A = Zᵀ·Z / K、b = Zᵀ·v / K 一次解出所有卖家的值：
+        φ = A⁺(b - ν·1)，ν 使 Σφ = v(N)。
+        没有 gain_engine 时 K 个联盟只需 K 次拟合，而排列采样需要 K·M 次；可由残差平方和计算增益的
+        gain_engine 下每个联盟是其 Gram 子块的一次 Cholesky 分解，与一次排列 (一次分解得到全部 M 个
+        前驱增益) 的代价同阶，此时 K 个联盟与 K 个排列的耗时相当。
+
+        Args:
+            X (np.array): 所有卖家的特征数据 (M, T)
+            Y (np.array): 目标预测任务数据 (T,)
+            K (int): 抽样的联盟个数
+            paired (bool): 是否成对抽样 (联盟 S 与其补集)，以降低方差
+            return_std (bool): 是否同时返回标准误 (由回归残差的夹心估计得到)
+
+        Returns:
+            np.array: 每个卖家的估计Shapley值 (M,)；return_std 为 True 时返回 (Shapley值, 标准误)
+        """
+        M, T = X.shape
+        full_gain = self._coalition_gains(X, Y, np.ones((1, M), dtype=bool))[0]
+        if M == 1:
+            shapley_values = np.array([full_gain])
+            return (shapley_values, np.zeros(1)) if return_std else shapley_values
+
+        # 联盟大小 s 的抽样概率 ∝ (M-1) / (s·(M-s))，同一大小内均匀抽样
+        sizes = np.arange(1, M)
+        size_probs = 1.0 / (sizes * (M - sizes))
+        size_probs /= size_probs.sum()
+        n_draws = max(1, K // 2) if paired else max(1, K)
+        draw_sizes = np.random.choice(sizes, size=n_draws, p=size_probs)
+        ranks = np.argsort(np.argsort(np.random.random((n_draws, M)), axis=1), axis=1)
+        masks = ranks < draw_sizes[:, None]
+        if paired:
+            masks = np.concatenate([masks, ~masks])
+
+        gains = self._coalition_gains(X, Y, masks)
+
+        # 约束加权最小二乘 (抽样已体现权重，各样本等权)
+        Z = masks.astype(float)
+        A_pinv = np.linalg.pinv(Z.T @ Z / len(Z), hermitian=True)
+        b = Z.T @ gains / len(Z)
+        ones_direction = A_pinv.sum(axis=1)  # A⁺·1
+        nu = (np.sum(A_pinv @ b) - full_gain) / np.sum(ones_direction)
+        shapley_values = A_pinv @ b - nu * ones_direction
+        if not return_std:
+            return shapley_values
+
+        # 夹心估计：φ 对 b 的线性映射 L 作用在每个样本的 z·残差 上
+        L = A_pinv - np.outer(ones_direction, ones_direction) / np.sum(ones_direction)
+        terms = Z * (gains - Z @ shapley_values)[:, None]
+        if paired:
+            terms = 0.5 * (terms[:n_draws] + terms[n_draws:])
+        terms = terms @ L
+        n = len(terms)
+        std_error = (
+            terms.std(axis=0, ddof=1) / np.sqrt(n) if n > 1 else np.full(M, np.inf)
+        )
+        return shapley_values, std_error
+
+    def banzhaf_msr(self, X, Y, K, return_std=False):
+        """
+        Banzhaf值的最大样本复用 (Maximum Sample Reuse, MSR) 估计
+
+        Banzhaf值 β_i = E_S[v(S ∪ {i}) - v(S)]，S 在其余卖家的所有子集中均匀分布。
+        每个卖家以 1/2 的概率独立加入联盟，抽样 K 个联盟后，
+        β_i = mean(v(S) | i ∈ S) - mean(v(S) | i ∉ S)，
+        即每个联盟的增益同时更新所有 M 个卖家的估计，而不只是一个边际贡献。
+        Banzhaf值不满足有效性 (Σβ_i ≠ v(N))，适合只需要卖家排序或按比例分配收益的场合。
+        联盟的代价与 shapley_kernel 相同：没有 gain_engine 时 K 个联盟为 K 次拟合，与 K/M 个排列相当；
+        可由残差平方和计算增益的 gain_engine 下每个联盟与一次排列的代价同阶。
+
+        Args:
+            X (np.array): 所有卖家的特征数据 (M, T)
+            Y (np.array): 目标预测任务数据 (T,)
+            K (int): 抽样的联盟个数
+            return_std (bool): 是否同时返回标准误
+
+        Returns:
+            np.array: 每个卖家的估计Banzhaf值 (M,)；return_std 为 True 时返回 (Banzhaf值, 标准误)
+        """
+        M, T = X.shape
+        masks = np.random.random((max(2, K), M)) < 0.5
+        gains = self._coalition_gains(X, Y, masks)
+
+        n_in = masks.sum(axis=0)
+        n_out = len(masks) - n_in
+        Z = masks.astype(float)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean_in = Z.T @ gains / n_in
+            mean_out = (1 - Z).T @ gains / n_out
+        banzhaf_values = np.nan_to_num(mean_in) - np.nan_to_num(mean_out)
+        if not return_std:
+            return banzhaf_values
+
+        # 两组样本均值之差的标准误
+        with np.errstate(divide="ignore", invalid="ignore"):
+            var_in = (Z.T @ gains**2 - n_in * mean_in**2) / (n_in - 1)
+            var_out = ((1 - Z).T @ gains**2 - n_out * mean_out**2) / (n_out - 1)
+            std_error = np.sqrt(
+                np.maximum(var_in, 0) / n_in + np.maximum(var_out, 0) / n_out
+            )
+        return banzhaf_values, np.where(np.isfinite(std_error), std_error, np.inf)
+
+    def shapley_blocks(self, blocks, Y, K, return_std=False, sampler="random"):
+        """
+        多列卖家的Shapley值：每个卖家提供一个数据块，参与者是卖家而不是列
+
+        联盟的增益在其全部列的并集上计算。有可由残差平方和计算增益的 gain_engine 时，
+        所有列的中心化 Gram 矩阵只计算一次 (按数据指纹缓存)，其子块即各卖家之间的块 Gram 矩阵：
+        每个卖家排列展开为列排列后做一次 Cholesky 分解，在各卖家块的末尾读出前驱子集的增益。
+        卖家较少时 (2^S·C³ 不超过 exact_budget，S 为卖家数、C 为总列数) 直接枚举 2^S 个卖家联盟
+        得到精确值，计算量只随卖家数而不是列数指数增长。
+
+        Args:
+            blocks (SellerBlocks | list): 多列卖家的数据，或每个卖家数据块 (m_i, T) 的列表
+            Y (np.array): 目标预测任务数据 (T,)
+            K (int): 蒙特卡洛采样的卖家排列数
+            return_std (bool): 是否同时返回标准误
+            sampler (str): 排列采样器，见 permutation_samplers.py
+
+        Returns:
+            np.array: 每个卖家的Shapley值 (S,)；return_std 为 True 时返回 (Shapley值, 标准误)
+        """
+        if sampler not in PERMUTATION_SAMPLERS:
+            raise ValueError(f"Unknown sampler: {sampler}")
+        if not isinstance(blocks, SellerBlocks):
+            blocks = SellerBlocks(blocks)
+        X = blocks.X
+        S, C = len(blocks), X.shape[0]
+
+        stats = scope = None
+        if self._supports_ssr:
+            stats = self.gain_engine.statistics(X, Y)
+            if 2**S * C**3 <= self.exact_budget:
+                masks = (np.arange(2**S)[:, None] >> np.arange(S)) & 1 == 1
+                column_masks = masks[:, np.repeat(np.arange(S), blocks.sizes)]
+                gains = self.gain_engine.coalition_gains(stats, column_masks)
+                shapley_values = self._shapley_from_gains(gains, S)
+                return (shapley_values, np.zeros(S)) if return_std else shapley_values
+        else:
+            # 缓存以卖家位掩码为键，作用域同时区分数据块的划分
+            scope = self._cache_scope(X, Y, blocks.sizes)
+
+        def permutation_marginals(permutation):
+            if stats is not None:
+                # 列排列上的前驱增益，在每个卖家块的最后一列处读出
+                ends = np.cumsum(blocks.sizes[permutation]) - 1
+                gains = self._permutation_gains(stats, blocks.columns(permutation))
+                gains = gains[ends]
+            else:
+                gains = np.zeros(S)
+                mask = 0
+                for i, seller in enumerate(permutation):
+                    mask |= 1 << int(seller)
+                    gains[i] = self._get_gain_for_coalition(
+                        X, Y, scope, blocks.columns(permutation[: i + 1]), mask
+                    )
+            return np.diff(gains, prepend=0.0)
+
+        mean, std_error = self._sample_permutations(
+            (S,), K, sampler, permutation_marginals
+        )
+        return (mean, std_error) if return_std else mean
+
+    def _seller_groups(self, X, groups=None, n_groups=None):
+        """
+        辅助函数：整理卖家分组，返回每组卖家下标的列表
+
+        groups 可以是每个卖家的组标签 (M,) 或各组下标的列表 (须恰好覆盖全部卖家)；
+        为 None 时对行归一化后的卖家数据做 KMeans 聚类 (即按余弦相似度分组)，
+        组数默认为 ⌈√M⌉，使每个样本的计算量 (组数 + 组大小) 最小。
+        """
+        M = X.shape[0]
+        if groups is None:
+            if n_groups is None:
+                n_groups = int(np.ceil(np.sqrt(M)))
+            kmeans = KMeans(
+                n_clusters=min(n_groups, M),
+                n_init=1,
+                random_state=np.random.randint(2**31),
+            )
+            groups = kmeans.fit_predict(normalize(X))
+
+        if len(groups) == M and np.ndim(groups[0]) == 0:
+            _, labels = np.unique(groups, return_inverse=True)
+            return [np.flatnonzero(labels == g) for g in range(labels.max() + 1)]
+
+        groups = [np.asarray(group, dtype=int) for group in groups if len(group) > 0]
+        if not np.array_equal(np.sort(np.concatenate(groups)), np.arange(M)):
+            raise ValueError("groups must partition the sellers 0, ..., M - 1")
+        return groups
+
+    def owen_values(self, X, Y, K, groups=None, n_groups=None, return_std=False):
+        """
+        两层 (Owen值) 收益分配，适合卖家很多且自然成组的情形 (同一提供方、同一领域、相关的数据流)
+
+        Owen值先把各组当作参与者，再在组内把组的价值分给成员：卖家 i 的值是在随机的组排列、
+        以及其所在组内随机的成员排列下，i 加入 "排在前面的组 + 组内排在前面的成员" 时的边际贡献的期望，
+        组内成员的值之和等于该组在组层面的Shapley值。
+
+        每个样本抽取一个组排列，沿排列依次加入整组 (组数次拟合) 得到各组的边际贡献；
+        同时按随机轮转的顺序选出一个组，在同一前驱组下展开其组内排列 (组大小次拟合)，
+        得到该组成员的边际贡献。单个样本约需 (组数 + 组大小) 次拟合，而不是 M 次。
+        样本中依次加入的联盟都是同一个卖家顺序的前缀，有可由残差平方和计算增益的 gain_engine 时
+        由一次 Cholesky 前缀扩展 (见 _permutation_gains) 得到全部所需增益，代价与一次排列相同。
+        成员估计最后按组层面的估计做一次可加校正，使组内之和与组的值一致。
+
+        Args:
+            X (np.array): 所有卖家的特征数据 (M, T)
+            Y (np.array): 目标预测任务数据 (T,)
+            K (int): 组排列的采样数
+            groups: 卖家分组，每个卖家的组标签 (M,) 或各组下标的列表；None 表示按相似度聚类
+            n_groups (int): 聚类的组数，None 表示 ⌈√M⌉
+            return_std (bool): 是否同时返回标准误 (由组内样本估计，未计入校正项的误差)
+
+        Returns:
+            np.array: 每个卖家的Owen值 (M,)；return_std 为 True 时返回 (Owen值, 标准误)
+        """
+        X = np.asarray(X, dtype=float)
+        M, T = X.shape
+        groups = self._seller_groups(X, groups, n_groups)
+        G = len(groups)
+        if self._supports_ssr:
+            stats = self.gain_engine.statistics(X, Y)
+        else:
+            scope = self._cache_scope(X, Y)
+
+        def prefix_gains(ordering, lengths):
+            # 一个样本依次加入的联盟都是同一个卖家顺序的前缀，只需给出各前缀的增益
+            if self._supports_ssr:
+                return self._permutation_gains(stats, ordering)[lengths - 1]
+            gains = np.empty(len(lengths))
+            mask, start = 0, 0
+            for step, length in enumerate(lengths):
+                mask |= coalition_mask(ordering[start:length])
+                start = length
+                gains[step] = self._get_gain_for_coalition(
+                    X, Y, scope, ordering[:length], mask
+                )
+            return gains
+
+        group_sum = np.zeros(G)
+        member_sum = np.zeros(M)
+        member_sq = np.zeros(M)
+        member_count = np.zeros(M)
+        schedule = np.random.permutation(G)
+        for k in range(K):
+            # 轮转选出展开组内排列的组；选择与组排列独立，成员估计保持无偏
+            if k % G == 0:
+                schedule = np.random.permutation(G)
+            chosen = schedule[k % G]
+
+            # 沿组排列依次加入整组；被选中的组在同一前驱组下依次加入组内成员
+            group_order = np.random.permutation(G)
+            members = np.random.permutation(groups[chosen])
+            ordering = np.concatenate(
+                [members if g == chosen else groups[g] for g in group_order]
+            ).astype(int)
+            lengths = []
+            for g in group_order:
+                start = lengths[-1] if lengths else 0
+                if g == chosen:
+                    lengths.extend(start + np.arange(1, len(members) + 1))
+                else:
+                    lengths.append(start + len(groups[g]))
+            gains = prefix_gains(ordering, np.array(lengths))
+
+            step = 0
+            previous = 0.0
+            for g in group_order:
+                if g == chosen:
+                    # 最后一个成员加入后即整组加入
+                    member_gain = previous
+                    for i in members:
+                        gain = gains[step]
+                        member_sum[i] += gain - member_gain
+                        member_sq[i] += (gain - member_gain) ** 2
+                        member_gain = gain
+                        step += 1
+                    member_count[groups[g]] += 1
+                else:
+                    gain = gains[step]
+                    step += 1
+                group_sum[g] += gain - previous
+                previous = gain
+
+        group_values = group_sum / max(K, 1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            member_mean = np.where(member_count > 0, member_sum / member_count, 0.0)
+        owen_values = np.zeros(M)
+        for g, group in enumerate(groups):
+            # 可加校正：组内之和等于组层面的估计 (从未展开的组即按人数均分)
+            correction = (group_values[g] - member_mean[group].sum()) / len(group)
+            owen_values[group] = member_mean[group] + correction
+        if not return_std:
+            return owen_values
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            variance = (member_sq - member_count * member_mean**2) / (member_count - 1)
+            std_error = np.sqrt(np.maximum(variance, 0) / member_count)
+        return owen_values, np.where(member_count > 1, std_error, np.inf)
+
+    def leave_one_out_values(self, X, Y, tol=1e-10):
+        """
+        每个卖家的留一值：v(N) - v(N \\ {i})，即该卖家退出后全集增益的下降
+
+        有可由残差平方和计算增益的 gain_engine 时，所有卖家的退出增益由全模型的一次 Cholesky 分解得到：
+        令 P = (X·Xᵀ)⁻¹、β = P·(X·Y)，去掉卖家 i 后的残差平方和为 SSR_{-i} = SSR + β_i² / P_ii，
+        总代价约为一次拟合。Gram 矩阵奇异 (存在共线卖家) 时改为对 M 个退出联盟批量求解。
+        否则需要 M + 1 次 (带缓存的) 拟合。
+
+        Args:
+            X (np.array): 所有卖家的特征数据 (M, T)
+            Y (np.array): 目标预测任务数据 (T,)
+            tol (float): Cholesky 对角元平方相对于 Gram 对角元低于该值时视为奇异
+
+        Returns:
+            np.array: 每个卖家的留一值 (M,)
+        """
+        M = X.shape[0]
+        if not self._supports_ssr:
+            scope = self._cache_scope(X, Y)
+            everyone = np.arange(M)
+            full_gain = self._get_gain_for_coalition(
+                X, Y, scope, everyone, coalition_mask(everyone)
+            )
+            return np.array(
+                [
+                    full_gain
+                    - self._get_gain_for_coalition(
+                        X,
+                        Y,
+                        scope,
+                        np.delete(everyone, i),
+                        coalition_mask(np.delete(everyone, i)),
+                    )
+                    for i in range(M)
+                ]
+            )
+
+        engine = self.gain_engine
+        stats = engine.statistics(X, Y)
+        try:
+            L = np.linalg.cholesky(stats.gram)
+            well_conditioned = np.all(np.diag(L) ** 2 > tol * np.diag(stats.gram))
+        except np.linalg.LinAlgError:
+            well_conditioned = False
+
+        if well_conditioned:
+            P = cho_solve((L, True), np.eye(M))
+            beta = P @ stats.xy
+            ssr = max(stats.yy - stats.xy @ beta, 0.0)
+            full_gain = engine.gains_from_ssr(ssr, stats.yy)
+            dropped_gains = engine.gains_from_ssr(ssr + beta**2 / np.diag(P), stats.yy)
+        else:
+            full_gain = engine.gain_from_statistics(stats)
+            dropped_gains = engine.coalition_gains(stats, ~np.eye(M, dtype=bool))
+        if M == 1:
+            dropped_gains = np.zeros(1)  # 空联盟的增益为 0
+        return full_gain - dropped_gains
+
+    def _singleton_gains(self, X, Y):
+        """
+        辅助函数：每个卖家单独提供数据时的增益 v({i})
+
+        有可由残差平方和计算增益的 gain_engine 时由闭式 SSR_i = Yᵀ·Y - (X_i·Y)² / (X_i·X_iᵀ) 得到。
+        """
+        M = X.shape[0]
+        if not self._supports_ssr:
+            scope = self._cache_scope(X, Y)
+            return np.array(
+                [
+                    self._get_gain_for_coalition(X, Y, scope, [i], 1 << i)
+                    for i in range(M)
+                ]
+            )
+
+        stats = self.gain_engine.statistics(X, Y)
+        variances = np.diag(stats.gram)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            explained = np.where(variances > 0, stats.xy**2 / variances, 0.0)
+        gains = self.gain_engine.gains_from_ssr(
+            np.maximum(stats.yy - explained, 0.0), stats.yy
+        )
+        return np.where(variances > 0, gains, 0.0)
+
+    def _screen_sellers(self, X, Y, prune_tol):
+        """
+        辅助函数：Shapley 采样前的预筛选，返回保留的卖家下标
+
+        留一值与单独增益都不超过 prune_tol 的卖家视为 (近似的) 零贡献者被排除；
+        只看留一值会误删与他人重复的卖家 (其留一值为 0，但Shapley值不为 0)。
+        对严格的零贡献者 (加入任何联盟都不改变增益)，排除后其余卖家的Shapley值不变。
+        所有卖家都被排除时保留全部卖家。
+        """
+        keep = (self.leave_one_out_values(X, Y) > prune_tol) | (
+            self._singleton_gains(X, Y) > prune_tol
+        )
+        if not np.any(keep):
+            keep[:] = True
+        return np.flatnonzero(keep)
+
+    def _total_similarities(self, X, similarity="exact", block_size=None):
+        """
+        每个卖家与其余所有卖家的余弦相似度之和 Σ_{j≠m} cos(x_m, x_j)
+
+        Args:
+            X (np.array): 所有卖家的特征数据 (M, T)
+            similarity (str): 计算方式
+                "exact": 构建完整的 M×M 余弦相似度矩阵 (与原实现逐位一致)，内存 O(M²)
+                "blocked": 每次只计算 block_size 行相似度并立即求行和，内存 O(block_size·M + M·T)，
+                    结果与 "exact" 仅有舍入误差
+                "factored": 记 u_m = x_m / ||x_m||，则行和 = u_m · Σ_j u_j，
+                    时间 O(M·T)、额外内存 O(T)，结果与 "exact" 仅有舍入误差
+            block_size (int): "blocked" 模式下每块的卖家数，None 表示按约 2^22 个元素自动选择
+
+        Returns:
+            np.array: 总相似度 (M,)
+        """
+        if similarity == "exact":
+            # X shape is (M, T), cosine_similarity expects (n_samples, n_features)
+            # 行和减 1 是因为要排除与自身的相似度（为1）
+            return np.sum(cosine_similarity(X), axis=1) - 1
+        if similarity == "blocked":
+            M = len(X)
+            if block_size is None:
+                block_size = max(1, 2**22 // max(M, 1))
+            unit_rows = normalize(X)
+            totals = np.empty(M)
+            for start in range(0, M, block_size):
+                block = unit_rows[start : start + block_size] @ unit_rows.T
+                totals[start : start + block_size] = np.sum(block, axis=1)
+            return totals - 1
+        if similarity == "factored":
+            unit_rows = normalize(X)
+            return unit_rows @ unit_rows.sum(axis=0) - 1
+        raise ValueError(f"Unknown similarity: {similarity}")
+
+    def replication_penalty(
+        self, X, lambda_param=np.log(2), similarity="exact", block_size=None
+    ):
+        """
+        复制惩罚因子 exp(-λ·Σ_{j≠m} cos(x_m, x_j))，与其他卖家越相似惩罚越重
+
+        Args:
+            X (np.array): 所有卖家的特征数据 (M, T)
+            lambda_param (float): 惩罚强度参数 λ
+            similarity, block_size: 相似度的计算方式，见 shapley_robust
+
+        Returns:
+            np.array: 每个卖家的惩罚因子 (M,)
+        """
+        # 计算每个特征 m 与所有其他特征的总相似度
+        total_similarity = self._total_similarities(X, similarity, block_size)
+        return np.exp(-lambda_param * total_similarity)
+
+    def shapley_robust(
+        self,
+        X,
+        Y,
+        K,
+        lambda_param=np.log(2),
+        tol=None,
+        confidence=0.95,
+        time_budget=None,
+        return_std=False,
+        sampler="random",
+        truncation_tol=None,
+        estimator="permutation",
+        similarity="exact",
+        block_size=None,
+        prune_tol=None,
+    ):
+        """
+        对复制鲁棒的Shapley值分配 (Algorithm 3: SHAPLEY-ROBUST)
+
+        Args:
+            X (np.array): 所有卖家的特征数据 (M, T)
+            Y (np.array): 目标预测任务数据 (T,)
+            K (int): 蒙特卡洛采样的迭代次数
+            lambda_param (float): 指数惩罚项的强度参数
+            tol, confidence, time_budget: 提前停止的条件，见 shapley_approx
+            sampler (str): 排列采样器，见 shapley_approx
+            truncation_tol (float): 截断蒙特卡洛的容限，见 shapley_approx
+            estimator (str): Shapley值的估计方法，"permutation" 为 shapley_approx，
+                "kernel" 为 shapley_kernel (适合卖家很多的情形)，"banzhaf" 为 banzhaf_msr
+                (只需要卖家排序或分配比例时更便宜)，"owen" 为 owen_values (卖家极多时按相似度聚类分组)；
+                kernel、banzhaf 的 K 为抽样的联盟个数，owen 的 K 为组排列数，上面的采样相关参数不适用
+            similarity (str): 总相似度的计算方式，见 _total_similarities
+            block_size (int): similarity 为 "blocked" 时每块的卖家数
+            prune_tol (float): 提供时先用 _screen_sellers 排除几乎没有贡献的卖家，只对其余卖家采样，
+                被排除卖家的值与标准误记为 0；None 表示不筛选
+            return_std (bool): 是否同时返回标准误 (按惩罚因子同比缩放)
+
+        Returns:
+            np.array: 每个卖家的鲁棒Shapley值 (M,)；return_std 为 True 时返回 (鲁棒Shapley值, 标准误)
+        """
+        # 1. 计算近似Shapley值
+        if estimator not in ("permutation", "kernel", "banzhaf", "owen"):
+            raise ValueError(f"Unknown estimator: {estimator}")
+        M = X.shape[0]
+        active = (
+            np.arange(M) if prune_tol is None else self._screen_sellers(X, Y, prune_tol)
+        )
+        X_active = X[active]
+        if estimator == "kernel":
+            values, errors = self.shapley_kernel(X_active, Y, K, return_std=True)
+        elif estimator == "banzhaf":
+            values, errors = self.banzhaf_msr(X_active, Y, K, return_std=True)
+        elif estimator == "owen":
+            values, errors = self.owen_values(X_active, Y, K, return_std=True)
+        else:
+            values, errors = self.shapley_approx(
+                X_active,
+                Y,
+                K,
+                tol=tol,
+                confidence=confidence,
+                time_budget=time_budget,
+                return_std=True,
+                sampler=sampler,
+                truncation_tol=truncation_tol,
+            )
+        approx_shapley = np.zeros(M)
+        std_error = np.zeros(M)
+        approx_shapley[active] = values
+        std_error[active] = errors
+
+        # 2. 应用指数惩罚 (相似度仍按全部卖家计算)
+        penalty_factors = self.replication_penalty(
+            X, lambda_param, similarity, block_size
+        )
+        robust_shapley = approx_shapley * penalty_factors
             
-        return robust_shapley
\ No newline at end of file
+        if return_std:
+            return robust_shapley, std_error * penalty_factors
+        return robust_shapley
+
+    def shapley_incremental(self, X, Y, K, lambda_param=None):
+        """
+        与 shapley_approx 相同的排列采样估计，但保存每个排列及其前驱子集的增益
+        (以及 Cholesky 因子)，之后卖家加入 (add_seller) 或退出 (remove_seller) 时只需重新计算
+        受影响的前驱子集，而不必重新采样。
+
+        Args:
+            X (np.array): 所有卖家的特征数据 (M, T)
+            Y (np.array): 目标预测任务数据 (T,)
+            K (int): 蒙特卡洛采样的迭代次数
+            lambda_param (float): 提供时返回鲁棒Shapley值 (见 shapley_robust)，None 返回近似Shapley值
+
+        Returns:
+            np.array: 每个卖家的Shapley值 (M,)
+        """
+        X = np.asarray(X, dtype=float)
+        M, T = X.shape
+        state = {"X": X, "Y": np.asarray(Y, dtype=float)}
+        state["permutations"] = [np.random.permutation(M) for _ in range(K)]
+        self.pool_state = state
+        self._evaluate_pool(state, [0] * K)
+        return self._pool_values(lambda_param)
+
+    def add_seller(self, x_new, lambda_param=None):
+        """
+        向 shapley_incremental 保存的卖家池加入一个卖家，新卖家的下标为 M
+
+        新卖家插入每个已保存排列的一个均匀随机位置 r：均匀排列经此插入后仍是 M + 1 个卖家的
+        均匀排列，因此所有已有样本都继续有效、权重不变。前 r 个前驱子集的增益与因子直接复用，
+        只需重新计算 r 之后的部分。
+
+        Args:
+            x_new (np.array): 新卖家的特征数据 (T,)
+            lambda_param (float): 提供时返回鲁棒Shapley值，None 返回近似Shapley值
+
+        Returns:
+            np.array: 更新后每个卖家的Shapley值 (M + 1,)
+        """
+        state = self._require_pool_state()
+        M = len(state["X"])
+        state["X"] = np.vstack([state["X"], np.asarray(x_new, dtype=float)[None]])
+        positions = []
+        for k, permutation in enumerate(state["permutations"]):
+            r = np.random.randint(M + 1)
+            state["permutations"][k] = np.insert(permutation, r, M)
+            positions.append(r)
+        self._evaluate_pool(state, positions, inserted=True)
+        return self._pool_values(lambda_param)
+
+    def remove_seller(self, index, lambda_param=None):
+        """
+        从 shapley_incremental 保存的卖家池移除下标为 index 的卖家，其后卖家的下标依次减 1
+
+        均匀排列删去一个卖家后仍是其余卖家的均匀排列，所有已有样本继续有效。
+        该卖家在排列中位置 r 之前的前驱子集不受影响，只需重新计算 r 之后的部分，
+        其 Cholesky 因子由一次秩一更新得到。
+
+        Args:
+            index (int): 要移除的卖家下标
+            lambda_param (float): 提供时返回鲁棒Shapley值，None 返回近似Shapley值
+
+        Returns:
+            np.array: 更新后每个卖家的Shapley值 (M - 1,)
+        """
+        state = self._require_pool_state()
+        state["X"] = np.delete(state["X"], index, axis=0)
+        positions = []
+        for k, permutation in enumerate(state["permutations"]):
+            r = int(np.flatnonzero(permutation == index)[0])
+            permutation = np.delete(permutation, r)
+            state["permutations"][k] = permutation - (permutation > index)
+            positions.append(r)
+        self._evaluate_pool(state, positions, removed=True)
+        return self._pool_values(lambda_param)
+
+    def _require_pool_state(self):
+        """辅助函数：返回 shapley_incremental 保存的卖家池状态，尚未建立时报错"""
+        if self.pool_state is None:
+            raise ValueError("call shapley_incremental before updating the seller pool")
+        return self.pool_state
+
+    def _evaluate_pool(self, state, positions, inserted=False, removed=False):
+        """
+        辅助函数：重新计算卖家池中每个排列从位置 positions[k] 开始的前驱子集增益
+
+        提供可由残差平方和计算增益的 gain_engine 时，复用因子的前 r 行：
+        插入时对剩余部分的 Schur 补重新分解，移除时对剩余因子做秩一更新；
+        排列中存在共线卖家 (无因子) 时整体重算该排列。否则逐个子集计算 (带缓存)。
+        """
+        X, Y = state["X"], state["Y"]
+        K = len(state["permutations"])
+        if not self._supports_ssr:
+            scope = self._cache_scope(X, Y)
+            old_gains = state.get("gains", [None] * K)
+            state["gains"] = []
+            for k, permutation in enumerate(state["permutations"]):
+                r = positions[k]
+                gains = np.empty(len(permutation))
+                if r > 0:
+                    gains[:r] = old_gains[k][:r]
+                for i in range(r, len(permutation)):
+                    subset = permutation[: i + 1]
+                    gains[i] = self._get_gain_for_coalition(
+                        X, Y, scope, subset, coalition_mask(subset)
+                    )
+                state["gains"].append(gains)
+            return
+
+        stats = self.gain_engine.statistics(X, Y)
+        state["stats"] = stats
+        old_z = state.get("z", [None] * K)
+        old_factors = state.get("factors", [None] * K)
+        state["gains"], state["z"], state["factors"] = [], [], []
+        for k, permutation in enumerate(state["permutations"]):
+            r, L = positions[k], old_factors[k]
+            z = factor = None
+            if r > 0 and L is not None:
+                z, factor = self._repair_factor(
+                    stats, permutation, r, L, old_z[k], inserted, removed
+                )
+            if factor is None:
+                gains, z, factor = self._permutation_gains(
+                    stats, permutation, return_factor=True
+                )
+            else:
+                gains = self._gains_from_projections(stats, z)
+            state["gains"].append(gains)
+            state["z"].append(z)
+            state["factors"].append(factor)
+
+    def _repair_factor(self, stats, permutation, r, L, z, inserted, removed, tol=1e-10):
+        """
+        辅助函数：复用旧 Cholesky 因子的前 r 行，得到新排列的因子与 z
+
+        Returns:
+            tuple: (z, L)，剩余部分出现共线卖家时返回 (None, None)
+        """
+        gram = stats.gram[np.ix_(permutation, permutation)]
+        xy = stats.xy[permutation]
+        L11, z1 = L[:r, :r], z[:r]
+        if inserted:
+            # 新卖家位于位置 r：其与前 r 个卖家的耦合由一次三角求解得到，
+            # 其余行沿用旧因子，剩余部分对 Schur 补重新分解
+            new_row = solve_triangular(L11, gram[:r, r], lower=True)
+            L21 = np.vstack([new_row, L[r:, :r]])
+            try:
+                L22 = np.linalg.cholesky(gram[r:, r:] - L21 @ L21.T)
+            except np.linalg.LinAlgError:
+                return None, None
+        elif removed:
+            # 删去旧因子的第 r 行/列：L22·L22ᵀ + l·lᵀ 即新的剩余块，做一次秩一更新
+            L21 = L[r + 1 :, :r]
+            L22 = _cholesky_rank_one_update(L[r + 1 :, r + 1 :], L[r + 1 :, r])
+        else:
+            return None, None
+
+        if not np.all(np.diag(L22) ** 2 > tol * np.diag(gram)[r:]):
+            return None, None
+        factor = np.zeros_like(gram)
+        factor[:r, :r] = L11
+        factor[r:, :r] = L21
+        factor[r:, r:] = L22
+        z2 = solve_triangular(L22, xy[r:] - L21 @ z1, lower=True)
+        return np.concatenate([z1, z2]), factor
+
+    def _pool_values(self, lambda_param=None):
+        """辅助函数：由卖家池中保存的前驱子集增益得到 (鲁棒) Shapley值"""
+        state = self._require_pool_state()
+        M = len(state["X"])
+        shapley_values = np.zeros(M)
+        for permutation, gains in zip(state["permutations"], state["gains"]):
+            shapley_values[permutation] += np.diff(gains, prepend=0.0)
+        shapley_values /= len(state["permutations"])
+        if lambda_param is None:
+            return shapley_values
+        return shapley_values * self.replication_penalty(state["X"], lambda_param)
+
+    @staticmethod
+    def allocation_ratios(values):
+        """
+        将卖家的价值 (Shapley值、Banzhaf值等) 归一化为收益分配比例
+
+        Args:
+            values (np.array): 每个卖家的价值 (M,)
+
+        Returns:
+            np.array: 分配比例 (M,)，总和为 1；价值总和不为正时均分
+        """
+        values = np.asarray(values, dtype=float)
+        if np.sum(values) > 0:
+            return values / np.sum(values)
+        return np.ones(len(values)) / len(values)  # 均分
+
+
+def _cholesky_rank_one_update(L, x):
+    """
+    Cholesky 因子的秩一更新：返回 L' 使 L'·L'ᵀ = L·Lᵀ + x·xᵀ
+
+    Args:
+        L (np.array): 下三角因子 (n, n)
+        x (np.array): 更新向量 (n,)
+
+    Returns:
+        np.array: 更新后的下三角因子 (n, n)
+    """
+    L = L.copy()
+    x = np.array(x, dtype=float)
+    for k in range(len(x)):
+        r = np.hypot(L[k, k], x[k])
+        c, s = r / L[k, k], x[k] / L[k, k]
+        L[k, k] = r
+        L[k + 1 :, k] = (L[k + 1 :, k] + s * x[k + 1 :]) / c
+        x[k + 1 :] = c * x[k + 1 :] - s * L[k + 1 :, k]
+    return L
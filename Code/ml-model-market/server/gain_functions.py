@@ -0,0 +1,170 @@
+import numpy as np
+
+# 增益函数库
+# 所有增益函数都接受 (y_true, y_pred)：
+#   - y_pred 形状为 (T,) 时返回一个 float，与原 gain_function_rmse 的调用方式一致；
+#   - y_pred 形状为 (K, T) 时一次 NumPy 运算返回 K 个增益 (K,)。
+# 增益统一定义为 1 - loss / baseline_loss，其中 baseline_loss 为最优常数预测的损失，
+# 并截断在 [0, 1] 内 (完美预测为 1，不优于常数预测为 0)。
+
+
+def batch_gain_function(func):
+    """标记一个增益函数支持批量的 (K, T) 预测输入"""
+    func.supports_batch = True
+    return func
+
+
+def evaluate_gains(gain_function, y_true, y_pred_batch):
+    """
+    对一批预测计算增益，自动兼容只支持单次调用的增益函数。
+
+    Args:
+        gain_function: 增益函数，输入 (y_true, y_pred)。
+        y_true (np.array): 真实目标值 (T,)。
+        y_pred_batch (np.array): 预测值 (K, T)。
+
+    Returns:
+        np.array: 每组预测的增益 (K,)。
+    """
+    if getattr(gain_function, "supports_batch", False):
+        return np.asarray(gain_function(y_true, y_pred_batch), dtype=float)
+    return np.array([gain_function(y_true, y_pred) for y_pred in y_pred_batch])
+
+
+def _as_batch(y_true, y_pred):
+    """将输入整理为 (T,) / (K, T)，并记录是否为单次调用"""
+    y_true = np.asarray(y_true, dtype=float)
+    y_pred = np.asarray(y_pred, dtype=float)
+    return y_true, np.atleast_2d(y_pred), y_pred.ndim == 1
+
+
+def _finish(gains, single):
+    """单次调用返回 float，批量调用返回数组"""
+    gains = np.clip(gains, 0, 1)
+    return float(gains[0]) if single else gains
+
+
+def _ratio_gain(loss, baseline):
+    """1 - loss / baseline，baseline 为零时 (目标为常数) 增益为 1"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(baseline == 0, 1.0, 1 - loss / baseline)
+
+
+@batch_gain_function
+def normalized_rmse_gain(y_true, y_pred):
+    """
+    增益 G = 1 - RMSE / std(y_true)
+
+    Args:
+        y_true (np.array): 真实目标值 (T,)
+        y_pred (np.array): 预测值 (T,) 或 (K, T)
+
+    Returns:
+        float | np.array: 预测增益
+    """
+    y_true, y_pred, single = _as_batch(y_true, y_pred)
+    rmse = np.sqrt(np.mean((y_pred - y_true) ** 2, axis=-1))
+    return _finish(_ratio_gain(rmse, np.std(y_true, axis=-1)), single)
+
+
+def _normalized_rmse_gain_from_ssr(ssr, sst):
+    return np.maximum(0, 1 - np.sqrt(ssr / sst))
+
+
+# 由残差平方和 SSR 与总平方和 SST 直接得到增益，供 OLSGainEngine 的充分统计量路径使用
+normalized_rmse_gain.from_ssr = _normalized_rmse_gain_from_ssr
+
+
+@batch_gain_function
+def r2_gain(y_true, y_pred):
+    """
+    增益 G = R² = 1 - SSR / SST
+
+    Args:
+        y_true (np.array): 真实目标值 (T,)
+        y_pred (np.array): 预测值 (T,) 或 (K, T)
+
+    Returns:
+        float | np.array: 预测增益
+    """
+    y_true, y_pred, single = _as_batch(y_true, y_pred)
+    ssr = np.sum((y_pred - y_true) ** 2, axis=-1)
+    sst = np.sum((y_true - np.mean(y_true, axis=-1, keepdims=True)) ** 2, axis=-1)
+    return _finish(_ratio_gain(ssr, sst), single)
+
+
+def _r2_gain_from_ssr(ssr, sst):
+    return np.maximum(0, 1 - ssr / sst)
+
+
+r2_gain.from_ssr = _r2_gain_from_ssr
+
+
+@batch_gain_function
+def mae_gain(y_true, y_pred):
+    """
+    增益 G = 1 - MAE / MAE(中位数预测)
+
+    Args:
+        y_true (np.array): 真实目标值 (T,)
+        y_pred (np.array): 预测值 (T,) 或 (K, T)
+
+    Returns:
+        float | np.array: 预测增益
+    """
+    y_true, y_pred, single = _as_batch(y_true, y_pred)
+    mae = np.mean(np.abs(y_pred - y_true), axis=-1)
+    median = np.median(y_true, axis=-1, keepdims=True)
+    baseline = np.mean(np.abs(y_true - median), axis=-1)
+    return _finish(_ratio_gain(mae, baseline), single)
+
+
+@batch_gain_function
+def huber_gain(y_true, y_pred, delta=None):
+    """
+    增益 G = 1 - Huber 损失 / Huber 损失(均值预测)
+
+    Args:
+        y_true (np.array): 真实目标值 (T,)
+        y_pred (np.array): 预测值 (T,) 或 (K, T)
+        delta (float): Huber 损失的阈值，默认 1.345 * std(y_true)
+
+    Returns:
+        float | np.array: 预测增益
+    """
+    y_true, y_pred, single = _as_batch(y_true, y_pred)
+    if delta is None:
+        delta = 1.345 * np.std(y_true)
+
+    def huber(residuals):
+        residuals = np.abs(residuals)
+        quadratic = np.minimum(residuals, delta)
+        return np.mean(0.5 * quadratic**2 + delta * (residuals - quadratic), axis=-1)
+
+    loss = huber(y_pred - y_true)
+    baseline = huber(y_true - np.mean(y_true, axis=-1, keepdims=True))
+    return _finish(_ratio_gain(loss, baseline), single)
+
+
+@batch_gain_function
+def log_loss_gain(y_true, y_pred, eps=1e-15):
+    """
+    二分类任务的增益 G = 1 - 对数损失 / 对数损失(基准率预测)
+
+    Args:
+        y_true (np.array): 真实标签 (T,)，取值为 0 或 1
+        y_pred (np.array): 预测为正类的概率 (T,) 或 (K, T)，会被截断到 [eps, 1 - eps]
+        eps (float): 概率截断阈值
+
+    Returns:
+        float | np.array: 预测增益
+    """
+    y_true, y_pred, single = _as_batch(y_true, y_pred)
+
+    def log_loss(p):
+        p = np.clip(p, eps, 1 - eps)
+        return -np.mean(y_true * np.log(p) + (1 - y_true) * np.log(1 - p), axis=-1)
+
+    loss = log_loss(y_pred)
+    baseline = log_loss(np.mean(y_true, axis=-1, keepdims=True))
+    return _finish(_ratio_gain(loss, baseline), single)
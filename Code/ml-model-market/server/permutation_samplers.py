@@ -0,0 +1,90 @@
+import numpy as np
+from scipy.stats import qmc
+
+# Shapley 蒙特卡洛估计的排列采样器
+# 每个采样器都是一个生成器，输入卖家数 M，不断产出"排列块" (若干个排列组成的列表)。
+# 同一块内的排列可以相关 (以降低方差)，不同块之间相互独立，
+# 因此 shapley_approx 以块内平均的边际贡献作为一个样本来估计均值与标准误。
+# 随机数均取自 np.random 的全局状态，np.random.seed 可使结果复现。
+
+
+def random_permutations(M):
+    """
+    独立均匀的随机排列 (原 shapley_approx 的采样方式)，每块一个排列。
+
+    Args:
+        M (int): 卖家数量。
+
+    Yields:
+        list: [排列 (M,)]。
+    """
+    while True:
+        yield [np.random.permutation(M)]
+
+
+def antithetic_permutations(M):
+    """
+    对偶排列：一个随机排列与其逆序排列成对出现。
+
+    卖家在两个排列中的前驱集合互补，边际贡献通常负相关，成对平均后方差更小。
+
+    Args:
+        M (int): 卖家数量。
+
+    Yields:
+        list: [排列, 逆序排列]。
+    """
+    while True:
+        permutation = np.random.permutation(M)
+        yield [permutation, permutation[::-1]]
+
+
+def stratified_permutations(M):
+    """
+    按位置分层的排列：一块 M 个排列构成一个随机拉丁方，每个卖家在每个位置
+    (即每种前驱集合大小) 恰好出现一次。
+
+    拉丁方取循环拉丁方 L[r, c] = (r + c) mod M 的随机同位变换：行、列与卖家标签各做一次
+    独立的随机置换，第 r 个排列为 σ[(π_r + τ_c) mod M]。每个排列单独看都是均匀随机的，
+    块内平均即按位置分层的无偏估计；由于列也被置换，各排列不是同一个排列的循环移位，
+    卖家的前驱集合不会相互嵌套。生成一块的代价为 O(M²)，与一块 M 个排列的边际贡献
+    计算相比可以忽略。
+
+    Args:
+        M (int): 卖家数量。
+
+    Yields:
+        list: M 个排列。
+    """
+    while True:
+        rows = np.random.permutation(M)
+        columns = np.random.permutation(M)
+        labels = np.random.permutation(M)
+        yield list(labels[(rows[:, None] + columns[None, :]) % M])
+
+
+def sobol_permutations(M, block_size=8):
+    """
+    拟随机排列：对加扰 Sobol 序列的每个点 u ∈ [0, 1)^M 取 argsort(u) 作为排列。
+
+    Sobol 点在单位超立方体中分布均匀，得到的排列比独立抽样更均衡。
+    块之间来自同一条序列而非严格独立，标准误为近似值。
+
+    Args:
+        M (int): 卖家数量。
+        block_size (int): 每块的排列数，取 2 的幂以保持 Sobol 序列的均衡性。
+
+    Yields:
+        list: block_size 个排列。
+    """
+    sampler = qmc.Sobol(d=M, scramble=True, seed=np.random.randint(2**31))
+    while True:
+        yield list(np.argsort(sampler.random(block_size), axis=1))
+
+
+PERMUTATION_SAMPLERS = {
+    "random": random_permutations,
+    "antithetic": antithetic_permutations,
+    "stratified": stratified_permutations,
+    "sobol": sobol_permutations,
+}
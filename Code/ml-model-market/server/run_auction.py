@@ -15,6 +15,8 @@ warnings.filterwarnings("ignore")
 def run_auction(bid, model_id, task_data):
     # 可切换使用 DynamicPricer 或 UCBPricer
     whichPricer = 0
+    # 可切换使用 Shapley(0) 或 Banzhaf(1) 值作为收益分配依据
+    whichValuation = 0
     price_range = (50, 500)
 
     # 初始化市场组件
@@ -48,11 +50,12 @@ def run_auction(bid, model_id, task_data):
         pricer.update_stats(chosen_index, revenue_n)
 
     # 步骤 8: Shapley 分配
-    shapley_values = divider.shapley_robust(X, Y, K=50)
-    if np.sum(shapley_values) > 0:
-        allocation_ratios = shapley_values / np.sum(shapley_values)
+    if whichValuation == 0:
+        shapley_values = divider.shapley_robust(X, Y, K=50)
     else:
-        allocation_ratios = np.ones(X.shape) / X.shape
+        # 联盟数与 50 次排列的边际贡献个数相同 (50·M)，逐个拟合模型时两者耗时相当
+        shapley_values = divider.shapley_robust(X, Y, K=50 * X.shape[0], estimator="banzhaf")
+    allocation_ratios = divider.allocation_ratios(shapley_values)
 
     seller_revenues = revenue_n * allocation_ratios
     seller_payouts = np.round(seller_revenues, 2).tolist()
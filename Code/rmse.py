@@ -1,7 +1,7 @@
 import numpy as np
 from shared import ml_model, price_range
 from sklearn.linear_model import LinearRegression
-from sklearn.metrics import mean_squared_error
+from gain_functions import normalized_rmse_gain
 
 
 # 模拟数据生成
@@ -20,16 +20,6 @@ ml_model = LinearRegression()
 
 
 # 增益函数 G = 1 - Normalized RMSE
-def gain_function_rmse(y_true, y_pred):
-    """
-    计算 1 - Normalized RMSE 作为增益函数
-    """
-    rmse = np.sqrt(mean_squared_error(y_true, y_pred))
-    # 归一化RMSE，使其值在 [0, inf) 之间，通常接近
-    # 通过除以目标变量的标准差进行归一化
-    y_std = np.std(y_true)
-    if y_std == 0:
-        return 1.0  # 避免除以零
-    normalized_rmse = rmse / y_std
-    # 增益为 1 - nrmse，确保值越大越好，并限制在 <= 1
-    return max(0, 1 - normalized_rmse)
+# 通过除以目标变量的标准差进行归一化，增益为 1 - nrmse，确保值越大越好，并限制在 [0, 1]
+# 兼容原有的 (y_true, y_pred) 调用，同时支持 (K, T) 的批量预测，见 gain_functions.py
+gain_function_rmse = normalized_rmse_gain
@@ -0,0 +1,434 @@
+"""
+数值一致性检查：增益引擎、各种 Shapley 快速路径与收益计算的结果应与逐个重新拟合
+(或数值求积) 的直接计算一致。
+
+运行: python -m pytest -q test_numerics.py
+"""
+
+import itertools
+import math
+
+import numpy as np
+import pytest
+from GainCurveIndex import GainCurveIndex
+from HonestAuction import HonestAuction
+from NoiseBank import NoiseBank
+from OLSGainEngine import OLSGainEngine, dataset_fingerprint
+from RecursiveLeastSquares import RecursiveLeastSquares
+from RevenueDiver import RevenueDivider, _cholesky_rank_one_update
+from RevenueIntegrator import RevenueIntegrator
+from rmse import gain_function_rmse
+from scipy.integrate import quad
+from sklearn.linear_model import LinearRegression
+
+
+def reference_gain(X, Y, model=None):
+    """在特征子集 X (m, T) 上重新拟合线性回归得到的增益，空集为 0"""
+    if len(X) == 0:
+        return 0.0
+    model = model if model is not None else LinearRegression()
+    model.fit(X.T, Y)
+    return gain_function_rmse(Y, model.predict(X.T))
+
+
+def brute_force_shapley(X, Y):
+    """按定义枚举全部排列计算的 Shapley 值"""
+    M = X.shape[0]
+    values = np.zeros(M)
+    for permutation in itertools.permutations(range(M)):
+        previous = 0.0
+        for k, seller in enumerate(permutation):
+            gain = reference_gain(X[list(permutation[: k + 1])], Y)
+            values[seller] += gain - previous
+            previous = gain
+    return values / math.factorial(M)
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    M, T = 5, 60
+    X = rng.random((M, T)) * 10
+    # 加入一个与其他卖家强相关的卖家，使各卖家的贡献有明显差别
+    X[4] = X[0] + 0.1 * rng.standard_normal(T)
+    Y = rng.standard_normal(M) @ X + rng.normal(0, 0.5, T)
+    return X, Y
+
+
+@pytest.fixture
+def divider():
+    return RevenueDivider(
+        ml_model=LinearRegression(),
+        gain_function=gain_function_rmse,
+        gain_engine=OLSGainEngine(),
+    )
+
+
+def test_engine_matches_linear_regression(data):
+    X, Y = data
+    engine = OLSGainEngine()
+    for size in range(1, len(X) + 1):
+        for subset in itertools.combinations(range(len(X)), size):
+            assert engine.gain(X[list(subset)], Y) == pytest.approx(
+                reference_gain(X[list(subset)], Y), abs=1e-9
+            )
+
+
+def test_recursive_least_squares_matches_linear_regression(data):
+    X, Y = data
+    assert reference_gain(X, Y, RecursiveLeastSquares()) == pytest.approx(
+        reference_gain(X, Y), abs=1e-8
+    )
+
+
+def test_leave_one_out_matches_refits(data, divider):
+    X, Y = data
+    full_gain = reference_gain(X, Y)
+    expected = [
+        full_gain - reference_gain(np.delete(X, i, axis=0), Y) for i in range(len(X))
+    ]
+    np.testing.assert_allclose(
+        divider.leave_one_out_values(X, Y), expected, rtol=0, atol=1e-9
+    )
+
+
+def test_exact_shapley_matches_brute_force(data, divider):
+    X, Y = data
+    np.testing.assert_allclose(
+        divider.shapley_exact(X, Y), brute_force_shapley(X, Y), rtol=0, atol=1e-9
+    )
+
+
+def test_permutation_gains_match_prefix_refits(data, divider):
+    X, Y = data
+    stats = divider.gain_engine.statistics(X, Y)
+    permutation = np.array([3, 0, 4, 2, 1])
+    expected = [
+        reference_gain(X[permutation[: k + 1]], Y) for k in range(len(permutation))
+    ]
+    np.testing.assert_allclose(
+        divider._permutation_gains(stats, permutation), expected, rtol=0, atol=1e-9
+    )
+
+
+def test_coalition_gains_match_refits(data, divider):
+    X, Y = data
+    M = len(X)
+    masks = (np.arange(2**M)[:, None] >> np.arange(M)) & 1 == 1
+    engine = divider.gain_engine
+    expected = [reference_gain(X[members], Y) for members in masks]
+    np.testing.assert_allclose(
+        engine.coalition_gains(engine.statistics(X, Y), masks),
+        expected,
+        rtol=0,
+        atol=1e-9,
+    )
+
+
+def test_coalition_gains_with_collinear_sellers(data, divider):
+    X, Y = data
+    # 重复的卖家使部分联盟的 Gram 子块奇异，需要回退到伪逆
+    X = np.vstack([X, X[1], X[2] - X[3]])
+    M = len(X)
+    masks = np.random.default_rng(1).random((200, M)) < 0.5
+    engine = divider.gain_engine
+    expected = [reference_gain(X[members], Y) for members in masks]
+    np.testing.assert_allclose(
+        engine.coalition_gains(engine.statistics(X, Y), masks),
+        expected,
+        rtol=0,
+        atol=1e-8,
+    )
+
+
+def brute_force_owen(X, Y, groups):
+    """按定义枚举全部组排列与组内成员排列计算的 Owen 值"""
+    values = np.zeros(len(X))
+    group_orders = list(itertools.permutations(range(len(groups))))
+    for g, group in enumerate(groups):
+        member_orders = list(itertools.permutations(group))
+        for group_order in group_orders:
+            before = [i for h in group_order[: group_order.index(g)] for i in groups[h]]
+            for member_order in member_orders:
+                for k, i in enumerate(member_order):
+                    coalition = before + list(member_order[:k])
+                    values[i] += reference_gain(X[coalition + [i]], Y) - reference_gain(
+                        X[coalition], Y
+                    )
+        values[group] /= len(group_orders) * len(member_orders)
+    return values
+
+
+@pytest.mark.parametrize("use_engine", [True, False])
+def test_owen_values_match_brute_force(data, use_engine):
+    X, Y = data
+    groups = [[0, 4], [1], [2, 3]]
+    divider = RevenueDivider(
+        ml_model=LinearRegression(),
+        gain_function=gain_function_rmse,
+        gain_engine=OLSGainEngine() if use_engine else None,
+    )
+    np.random.seed(0)
+    values, std_error = divider.owen_values(
+        X, Y, K=2000, groups=groups, return_std=True
+    )
+    expected = brute_force_owen(X, Y, groups)
+    # 成员估计应在几个标准误之内 (与 Shapley 值相差约 0.02，足以区分)
+    assert np.all(np.abs(values - expected) <= 5 * std_error + 1e-3)
+
+
+def test_rank_one_update_matches_refactorization():
+    rng = np.random.default_rng(2)
+    A = rng.standard_normal((6, 6))
+    A = A @ A.T + np.eye(6)
+    x = rng.standard_normal(6)
+    np.testing.assert_allclose(
+        _cholesky_rank_one_update(np.linalg.cholesky(A), x),
+        np.linalg.cholesky(A + np.outer(x, x)),
+        rtol=0,
+        atol=1e-10,
+    )
+
+
+def assert_pool_matches_refits(divider, X, Y):
+    """卖家池中每个排列的前驱子集增益与因子应与重新计算的结果一致"""
+    state = divider.pool_state
+    gram = divider.gain_engine.statistics(X, Y).gram
+    for permutation, gains, factor in zip(
+        state["permutations"], state["gains"], state["factors"]
+    ):
+        expected = [reference_gain(X[permutation[: k + 1]], Y) for k in range(len(X))]
+        np.testing.assert_allclose(gains, expected, rtol=0, atol=1e-9)
+        np.testing.assert_allclose(
+            factor @ factor.T, gram[np.ix_(permutation, permutation)], atol=1e-8
+        )
+
+
+def test_incremental_updates_match_refits(data, divider):
+    X, Y = data
+    np.random.seed(0)
+    divider.shapley_incremental(X[:4], Y, K=8)
+    divider.add_seller(X[4])
+    # 新卖家插入位置 r > 0 的排列复用旧因子 (_repair_factor)
+    assert any(
+        permutation[0] != 4 for permutation in divider.pool_state["permutations"]
+    )
+    assert_pool_matches_refits(divider, X, Y)
+
+    values = divider.remove_seller(1)
+    X = np.delete(X, 1, axis=0)
+    assert_pool_matches_refits(divider, X, Y)
+    # Shapley 值即各排列边际贡献的平均
+    expected = np.zeros(len(X))
+    for permutation in divider.pool_state["permutations"]:
+        gains = [reference_gain(X[permutation[: k + 1]], Y) for k in range(len(X))]
+        expected[permutation] += np.diff(gains, prepend=0.0)
+    np.testing.assert_allclose(
+        values, expected / len(divider.pool_state["permutations"]), atol=1e-9
+    )
+
+
+def brute_force_block_shapley(blocks, Y):
+    """以卖家 (数据块) 为参与者，枚举全部卖家排列计算的 Shapley 值"""
+    S = len(blocks)
+    values = np.zeros(S)
+    for permutation in itertools.permutations(range(S)):
+        previous = 0.0
+        for k, seller in enumerate(permutation):
+            columns = [blocks[i] for i in permutation[: k + 1]]
+            gain = reference_gain(np.vstack(columns), Y)
+            values[seller] += gain - previous
+            previous = gain
+    return values / math.factorial(S)
+
+
+@pytest.fixture
+def blocks(data):
+    X, Y = data
+    rng = np.random.default_rng(3)
+    return [X[:2], X[2:3], np.vstack([X[3:], rng.random((1, X.shape[1]))])], Y
+
+
+def test_exact_block_shapley_matches_brute_force(blocks, divider):
+    blocks, Y = blocks
+    np.testing.assert_allclose(
+        divider.shapley_blocks(blocks, Y, K=10),
+        brute_force_block_shapley(blocks, Y),
+        rtol=0,
+        atol=1e-9,
+    )
+
+
+def test_sampled_block_shapley_matches_refits(blocks, divider):
+    blocks, Y = blocks
+    divider.exact_budget = 0
+    sklearn_divider = RevenueDivider(
+        ml_model=LinearRegression(), gain_function=gain_function_rmse
+    )
+    # 相同的随机种子给出相同的卖家排列：Cholesky 路径应与逐个联盟重新拟合完全一致
+    np.random.seed(0)
+    values, std_error = divider.shapley_blocks(blocks, Y, K=300, return_std=True)
+    np.random.seed(0)
+    expected = sklearn_divider.shapley_blocks(blocks, Y, K=300)
+    np.testing.assert_allclose(values, expected, rtol=0, atol=1e-9)
+    assert np.all(
+        np.abs(values - brute_force_block_shapley(blocks, Y)) <= 5 * std_error
+    )
+
+
+@pytest.fixture
+def targets(data):
+    X, Y = data
+    rng = np.random.default_rng(4)
+    other = rng.standard_normal(len(X)) @ X + rng.normal(0, 1, len(Y))
+    return np.column_stack([Y, other, Y**2])
+
+
+def test_exact_multi_target_matches_brute_force(data, targets, divider):
+    X, _ = data
+    expected = [brute_force_shapley(X, Y) for Y in targets.T]
+    np.testing.assert_allclose(
+        divider.shapley_multi_target(X, targets, K=10), expected, rtol=0, atol=1e-9
+    )
+
+
+@pytest.mark.parametrize("model", [LinearRegression, RecursiveLeastSquares])
+def test_sampled_multi_target_matches_refits(data, targets, divider, model):
+    X, _ = data
+    divider.exact_budget = 0
+    # RecursiveLeastSquares 不接受二维目标，走逐个任务拟合的回退路径
+    model_divider = RevenueDivider(ml_model=model(), gain_function=gain_function_rmse)
+    np.random.seed(0)
+    values = divider.shapley_multi_target(X, targets, K=20)
+    np.random.seed(0)
+    expected = model_divider.shapley_multi_target(X, targets, K=20)
+    np.testing.assert_allclose(values, expected, rtol=0, atol=1e-8)
+    # 与各任务单独估计 (同样的排列) 一致
+    for b, Y in enumerate(targets.T):
+        np.random.seed(0)
+        np.testing.assert_allclose(
+            values[b], divider.shapley_approx(X, Y, K=20), rtol=0, atol=1e-9
+        )
+
+
+def myerson_revenue(g, b_n, breakpoints=None):
+    """按定义 b·g(b) - ∫_0^b g(z) dz 用自适应求积计算的收益"""
+    integral, _ = quad(g, 0, b_n, points=breakpoints, limit=200)
+    return max(0.0, b_n * g(b_n) - integral)
+
+
+def smooth_gain(gaps):
+    """一条光滑、随价格差递减的增益曲线"""
+    return 0.9 * np.exp(-np.asarray(gaps, dtype=float) / 80)
+
+
+@pytest.mark.parametrize("p_n, b_n", [(50, 20), (120, 120), (200, 350), (0, 60)])
+def test_gain_curve_revenue_matches_quadrature(p_n, b_n):
+    index = GainCurveIndex(smooth_gain, 400, tol=1e-7, max_points=4097)
+    expected = myerson_revenue(lambda z: smooth_gain(max(0.0, p_n - z)), b_n)
+    assert index.revenue(p_n, b_n) == pytest.approx(expected, abs=1e-4)
+    # 对分段线性曲线，闭式积分是精确的
+    gaps = np.array([0, 30, 90, 250, 400])
+    points = GainCurveIndex.from_points(gaps, [0.9, 0.7, 0.5, 0.2, 0.1])
+    kinks = [z for z in p_n - gaps if 0 < z < b_n] or None
+    exact = myerson_revenue(
+        lambda z: float(points.gain(max(0.0, p_n - z))), b_n, breakpoints=kinks
+    )
+    assert points.revenue(p_n, b_n) == pytest.approx(exact, abs=1e-10)
+
+
+@pytest.mark.parametrize("adaptive", [True, False])
+@pytest.mark.parametrize("p_n, b_n", [(50, 20), (120, 120), (200, 350)])
+def test_integrator_revenue_matches_quadrature(p_n, b_n, adaptive):
+    def g(z):
+        return smooth_gain(np.maximum(0.0, p_n - np.asarray(z)))
+
+    revenue, error, evaluations = RevenueIntegrator(tol=1e-6).revenue(
+        g, p_n, b_n, adaptive=adaptive
+    )
+    expected = myerson_revenue(lambda z: float(g(z)), b_n)
+    assert abs(revenue - expected) <= max(error, 1e-6)
+    assert revenue == pytest.approx(expected, abs=1e-4)
+    assert evaluations <= RevenueIntegrator().max_evaluations + 1
+
+
+def test_fixed_integrate_error_covers_noise():
+    # 带噪声的被积函数：报告的误差应与积分值的实际波动同一量级 (约一个标准误)
+    integrator = RevenueIntegrator()
+    rng = np.random.default_rng(5)
+    truth = 0.9 * 80 * (1 - np.exp(-100 / 80))
+
+    def noisy(z):
+        return smooth_gain(z) + rng.normal(0, 0.05, len(z))
+
+    results = [integrator.fixed_integrate(noisy, 0.0, 100.0) for _ in range(200)]
+    values = np.array([value for value, _, _ in results])
+    errors = np.array([error for _, error, _ in results])
+    assert abs(values.mean() - truth) <= 3 * values.std() / np.sqrt(len(values))
+    assert 0.8 <= errors.mean() / values.std() <= 2
+
+
+def test_expected_mode_revenue_matches_quadrature(data):
+    X, Y = data
+    auction = HonestAuction(
+        ml_model=LinearRegression(),
+        gain_function=gain_function_rmse,
+        allocation_mode="expected",
+    )
+    for p_n, b_n in [(100, 60), (100, 180)]:
+        expected = myerson_revenue(
+            lambda z: float(auction.get_prediction_gains(X, Y, p_n, [z])[0]),
+            b_n,
+            breakpoints=[p_n] if p_n < b_n else None,
+        )
+        revenue, error = auction.calculate_revenue(X, Y, p_n, b_n, return_error=True)
+        assert revenue == pytest.approx(
+            expected, abs=max(auction.integrator.tol, error)
+        )
+
+
+def test_noise_bank_is_reproducible():
+    bank = NoiseBank(seed=7, max_entries=1)
+    first = bank.standard_normal((3, 4), key="request-1")
+    assert not first.flags.writeable
+    np.testing.assert_array_equal(bank.standard_normal((3, 4), key="request-1"), first)
+    assert not np.allclose(bank.standard_normal((3, 4), key="request-2"), first)
+    # 被淘汰后重新生成、或换一个相同种子的实例，得到的噪声都不变
+    np.testing.assert_array_equal(bank.standard_normal((3, 4), key="request-1"), first)
+    np.testing.assert_array_equal(
+        NoiseBank(seed=7).standard_normal((3, 4), key="request-1"), first
+    )
+
+
+def test_common_mode_gains_match_refits(data):
+    X, Y = data
+    auction = HonestAuction(
+        ml_model=LinearRegression(),
+        gain_function=gain_function_rmse,
+        allocation_mode="common",
+        seed=7,
+    )
+    p_n, bids = 100.0, np.array([20.0, 60.0, 99.0, 150.0])
+    noise = NoiseBank(seed=7).standard_normal(
+        X.shape, key=("auction-1", dataset_fingerprint(X, Y))
+    )
+    expected = [
+        reference_gain(X + 0.1 * max(0.0, p_n - b_n) * noise, Y) for b_n in bids
+    ]
+    np.testing.assert_allclose(
+        auction.get_prediction_gains(X, Y, p_n, bids, request_id="auction-1"),
+        expected,
+        rtol=0,
+        atol=1e-9,
+    )
+
+    # 同一请求的收益可以复现，不同请求使用不同的噪声
+    revenue = auction.calculate_revenue(X, Y, p_n, 80.0, request_id="auction-1")
+    again = HonestAuction(
+        ml_model=LinearRegression(),
+        gain_function=gain_function_rmse,
+        allocation_mode="common",
+        seed=7,
+    )
+    assert again.calculate_revenue(X, Y, p_n, 80.0, request_id="auction-1") == revenue
+    assert again.calculate_revenue(X, Y, p_n, 80.0, request_id="auction-2") != revenue